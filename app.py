@@ -1,14 +1,60 @@
+import os
+import threading
+import time
+from collections import Counter
 import streamlit as st
 from streamlit_autorefresh import st_autorefresh
 import pandas as pd
 from dotenv import load_dotenv
-from datetime import datetime, date, timezone
-from binance_client import get_trades, get_price, get_balance, get_open_orders, get_real_balance
-from pnl_calculator import calculate_daily_pnl
-from storytelling_calculator import processar_trades_completos
+from datetime import datetime, date, timedelta, timezone
+import daily_rollup
+import metrics
+import portfolio
+import view_layer
+from storytelling_calculator import preparar_exibicao, tipar_historico
+
+# Com BINANCE_STREAMING=1 os dados chegam por WebSocket e o painel só lê o estado em memória
+STREAMING = os.getenv("BINANCE_STREAMING", "0") == "1"
+
+# Com PAINEL_FONTE=coletor o painel só lê o que o collector.py publicou, sem chamar a Binance
+FONTE_COLETOR = os.getenv("PAINEL_FONTE", "direto") == "coletor"
+
+REFRESH_SECONDS = 5 if STREAMING or FONTE_COLETOR else 60
+
+# Históricos mantidos no cache (um por conta, par e último trade); os mais antigos saem primeiro
+CACHE_HISTORICOS_MAX = int(os.getenv("CACHE_HISTORICOS_MAX", "64"))
+
+# Os dados seguem numéricos até a tela; a formatação fica só na configuração das colunas
+COLUNAS_HISTORICO = {
+    "Qtd": st.column_config.NumberColumn(format="%.4f"),
+    "Preço": st.column_config.NumberColumn(format="$%.4f"),
+    "Total": st.column_config.NumberColumn(format="$%.2f"),
+    "PnL USDT": st.column_config.NumberColumn(format="$%.2f"),
+    "PnL %": st.column_config.NumberColumn(format="%.2f%%"),
+    "Data/Hora": st.column_config.DatetimeColumn(format="DD/MM/YYYY HH:mm:ss"),
+}
+COLUNAS_ATIVOS = {
+    "Qtd": st.column_config.NumberColumn(format="%.6f"),
+    "Preço Atual": st.column_config.NumberColumn(format="$%.4f"),
+    "Valor Atual (USDT)": st.column_config.NumberColumn(format="$%.2f"),
+    "PnL do Dia (USDT)": st.column_config.NumberColumn(format="$%+.2f"),
+}
+COLUNAS_ORDENS = {
+    "Qtd": st.column_config.NumberColumn(format="%.4f"),
+    "Executado": st.column_config.NumberColumn(format="%.4f"),
+    "Preço": st.column_config.NumberColumn(format="$%.4f"),
+    "Criada em": st.column_config.DatetimeColumn(format="DD/MM/YYYY HH:mm:ss"),
+    "Quando": st.column_config.DatetimeColumn(format="DD/MM/YYYY HH:mm:ss"),
+    "No livro há (min)": st.column_config.NumberColumn(format="%.1f"),
+    "No livro (min)": st.column_config.NumberColumn(format="%.1f"),
+}
+
+# Filtros e ordenação das tabelas de trades; "Data/Hora" ordena pela coluna numérica "time"
+FILTROS_TRADES = ["Conta", "Estratégia", "symbol", "Tipo"]
+ORDENACAO_TRADES = {"Data/Hora": "time", "PnL USDT": "PnL USDT", "PnL %": "PnL %", "Total": "Total", "Qtd": "Qtd"}
 
 st.set_page_config(page_title="Binance PnL Online", layout="wide")
-st_autorefresh(interval=1 * 60 * 1000, key="data_refresh")
+st_autorefresh(interval=REFRESH_SECONDS * 1000, key="data_refresh")
 
 # ⏰ Controle de dia com base no horário da Binance (UTC)
 if "last_loaded_day" not in st.session_state:
@@ -20,9 +66,142 @@ if st.session_state["last_loaded_day"] != datetime.now(timezone.utc).date():
 st.title("📡 PnL com dados ao vivo da Binance")
 st.caption("Este painel mostra o desempenho detalhado das suas estratégias de trade na Binance, com histórico completo de operações.")
 
-ativos = {
-    "XRPUSDT": "QuickScalp",
-}
+# Contas, pares e estratégias vêm do portfólio (portfolio.json ou a conta única do .env)
+contas = portfolio.carregar_portfolio()
+
+# Endpoint /metrics em METRICS_PORT (desativado por padrão)
+metrics.iniciar_servidor()
+
+
+@st.cache_resource
+def _estatisticas_cache():
+    """Contadores de chamadas e de execuções (misses) das funções em cache, por processo."""
+    return {"lock": threading.Lock(), "chamadas": Counter(), "misses": Counter()}
+
+
+def _contar(nome, miss=False):
+    stats = _estatisticas_cache()
+    with stats["lock"]:
+        stats["misses" if miss else "chamadas"][nome] += 1
+
+
+def _tabela_de_trades(df, chave):
+    """
+    Tabela de trades filtrada, ordenada e paginada no servidor: só as linhas
+    da página atual são preparadas e enviadas ao navegador.
+    """
+    filtros_presentes = [c for c in FILTROS_TRADES if c in df.columns]
+    colunas = st.columns(len(filtros_presentes) + 2)
+    filtros = {
+        c: col.multiselect(c, sorted(df[c].dropna().unique()), key=f"{chave}_filtro_{c}")
+        for c, col in zip(filtros_presentes, colunas)
+    }
+    ordem = colunas[-2].selectbox("Ordenar por", list(ORDENACAO_TRADES), key=f"{chave}_ordem")
+    crescente = colunas[-1].toggle("Crescente", key=f"{chave}_crescente")
+
+    filtrado = view_layer.ordenar(view_layer.filtrar(df, filtros), ORDENACAO_TRADES[ordem], crescente)
+    paginas = max(1, -(-len(filtrado) // view_layer.PAGE_SIZE))
+    pagina = st.number_input("Página", min_value=1, max_value=paginas, value=1, key=f"{chave}_pagina")
+    fatia, pagina, paginas = view_layer.paginar(filtrado, pagina)
+
+    st.dataframe(preparar_exibicao(fatia), use_container_width=True, column_config=COLUNAS_HISTORICO)
+    inicio = (pagina - 1) * view_layer.PAGE_SIZE
+    st.caption(f"Linhas {min(inicio + 1, len(filtrado))}–{inicio + len(fatia)} de {len(filtrado)} (página {pagina} de {paginas}).")
+
+
+@st.cache_resource
+def _conexao(contas):
+    """Clientes da Binance de cada conta (e os streams, se ativos) criados uma única vez por processo."""
+    _contar("conexão", miss=True)
+    import binance_client
+
+    clientes = {}
+    for conta, cfg in contas.items():
+        with portfolio.usar_conta(conta):
+            clientes[conta] = binance_client.get_account_client()
+            if STREAMING:
+                from stream_state import start_stream
+                start_stream(list(cfg["ativos"]))
+    return clientes
+
+
+@st.cache_data(max_entries=CACHE_HISTORICOS_MAX, show_spinner=False)
+def _historico_em_cache(conta, symbol, estrategia, last_trade_id):
+    """
+    Histórico e checkpoint do par na conta, recalculados apenas quando chega
+    um trade novo (`last_trade_id`). Não dependem do preço, então não têm
+    prazo de validade: a chave já muda quando o resultado mudaria.
+    """
+    _contar("históricos", miss=True)
+    from position_checkpoint import carregar_historico
+
+    return carregar_historico(symbol, estrategia)
+
+
+def _processar_com_cache(symbol, estrategia, preco_atual):
+    import trade_store
+    from position_checkpoint import posicao_atual
+
+    _contar("históricos")
+    historico, checkpoint = _historico_em_cache(
+        portfolio.conta_atual(), symbol, estrategia, trade_store.last_trade_id(symbol)
+    )
+    # A posição aberta é a única parte que depende do preço: avaliada a cada ciclo, fora do cache
+    return historico, posicao_atual(symbol, estrategia, checkpoint, preco_atual)
+
+
+@st.cache_data(ttl=REFRESH_SECONDS, show_spinner="🔄 Coletando dados da Binance...")
+def _painel_em_cache(contas, dia):
+    """
+    Ciclo de coleta completo de todas as contas, reaproveitado por
+    REFRESH_SECONDS: trocar de aba ou mexer em widgets não refaz chamadas
+    de rede nem cálculos.
+    """
+    _contar("painel", miss=True)
+    from data_collector import montar_portfolio
+
+    return montar_portfolio(contas, processar=_processar_com_cache)
+
+
+@st.cache_data(ttl=REFRESH_SECONDS, show_spinner=False)
+def _resumo_em_cache(contas, inicio, fim):
+    _contar("rollups", miss=True)
+    return daily_rollup.resumo_consolidado(contas, inicio, fim)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _snapshot_em_cache(criado_em):
+    """
+    Última coleta publicada pelo coletor, lida e desserializada uma vez por
+    publicação (`criado_em`). O mesmo objeto é entregue a todas as sessões:
+    somente leitura.
+    """
+    _contar("snapshot", miss=True)
+    import snapshot_store
+
+    painel, _ = snapshot_store.load_latest()
+    return painel
+
+
+if FONTE_COLETOR:
+    import snapshot_store
+
+    criado_em = snapshot_store.latest_created_at()
+    if criado_em is None:
+        st.warning("⏳ Aguardando a primeira coleta do collector.py...")
+        st.stop()
+    _contar("snapshot")
+    painel = _snapshot_em_cache(criado_em)
+    idade = time.time() - criado_em
+    if idade > 3 * float(os.getenv("COLLECTOR_INTERVAL", "60")):
+        st.warning(f"⚠️ Dados do coletor desatualizados há {idade:.0f}s.")
+else:
+    _conexao(contas)
+    _contar("conexão")
+
+    # Coleta paralela das contas e dos pares, limitada pelo peso de requisições da Binance
+    _contar("painel")
+    painel = _painel_em_cache(contas, datetime.now(timezone.utc).date())
 
 all_trades = []
 all_posicoes = []
@@ -30,81 +209,57 @@ resumos = []
 saldos_usdt = []
 saldos_tokens = []
 operacoes_realizadas = []
-ordens_abertas = []
-
-with st.spinner("🔄 Coletando dados da Binance..."):
-    for symbol, estrategia in ativos.items():
-        try:
-            trades = get_trades(symbol)
-            preco_atual = get_price(symbol)
-
-            token = symbol.replace("USDT", "")
-            saldo_livre, _ = get_balance(token)
-            saldo_livre = float(saldo_livre)
-
-            df_trades = pd.DataFrame(trades)
-            df_trades["symbol"] = symbol
-            df_price = pd.DataFrame([{"symbol": symbol, "current_price": preco_atual}])
-
-            if not df_trades.empty:
-                df_story, df_posicao = processar_trades_completos(df_trades, df_price, estrategia)
-                df_story["Estratégia"] = estrategia
-                all_trades.append(df_story)
-
-                if not df_posicao.empty:
-                    df_posicao["Estratégia"] = estrategia
-                    all_posicoes.append(df_posicao)
-                    resumos.append(df_posicao)
-
-                realizadas = df_story[df_story["PnL USDT"].str.contains(r"^-?\$")]
-                realizadas["pnl_num"] = pd.to_numeric(
-                    realizadas["PnL USDT"].str.replace("$", "").replace("-", None),
-                    errors="coerce"
-                ).fillna(0.0)
-                realizadas["Data"] = pd.to_datetime(realizadas["Data/Hora"]).dt.date
-                operacoes_realizadas.append(realizadas)
-
-            saldos_tokens.append((token, saldo_livre))
-            saldos_usdt.append(saldo_livre * preco_atual)
-
-            # Ordens abertas (pendentes)
-            ordens = get_open_orders(symbol)
-            for ordem in ordens:
-                ordens_abertas.append({
-                    "Ativo": ordem["symbol"],
-                    "Tipo": ordem["side"],
-                    "Qtd": float(ordem["origQty"]),
-                    "Preço": float(ordem["price"]),
-                    "Status": ordem["status"],
-                    "Criada em": ordem["time"]
-                })
-
-        except Exception as e:
-            st.error(f"Erro ao processar {symbol}: {e}")
-
-# Saldo USDT
-try:
-    usdt_saldo, _ = get_balance("USDT")
-    usdt_saldo = float(usdt_saldo)
-except:
-    usdt_saldo = 0.0
+
+for origem, e in painel["erros"]:
+    st.error(f"Erro ao processar {origem}: {e}")
+
+for fonte, info in painel.get("desatualizados", {}).items():
+    desde = datetime.fromtimestamp(info["desde"]).strftime("%H:%M:%S")
+    st.warning(f"⚠️ {fonte}: Binance indisponível desde {desde}; exibindo o último dado conhecido. ({info['erro']})")
+
+for r in painel["resultados"]:
+    symbol, estrategia, token = r["symbol"], r["estrategia"], r["token"]
+    conta = r.get("conta", portfolio.CONTA_PADRAO)
+    df_story, df_posicao = r["historico"], r["posicao"]
+
+    if not df_story.empty:
+        # O painel pode ser o do cache compartilhado entre sessões: cópias marcadas, sem alterá-lo
+        df_story = df_story.assign(**{"Estratégia": estrategia, "Conta": conta})
+        all_trades.append(df_story)
+
+        if not df_posicao.empty:
+            df_posicao = df_posicao.assign(**{"Estratégia": estrategia, "Conta": conta})
+            all_posicoes.append(df_posicao)
+            resumos.append(df_posicao)
+
+        operacoes_realizadas.append(df_story[df_story["PnL USDT"].notna()])
+
+    saldos_tokens.append((token, r["saldo_livre"]))
+    saldos_usdt.append(r["saldo_livre"] * r["preco_atual"])
+
+usdt_saldo = painel["usdt_saldo"]
+
+# Livro de ordens da conta: uma consulta por ciclo, já numérico e com os eventos do dia
+ordens_abertas = painel.get("ordens", [])
+eventos_ordens = painel.get("eventos_ordens", [])
 
 meta_dia = 0.50  # 🎯 Meta de lucro diário em USDT
 
 # Tabs
 tab1, tab2 = st.tabs(["📊 Análise Geral", "📆 Análise do Dia"])
 if all_trades:
-    df_full = pd.concat(all_trades, ignore_index=True)
-    df_realizadas = pd.concat(operacoes_realizadas, ignore_index=True)
+    df_full = tipar_historico(pd.concat(all_trades, ignore_index=True))
+    df_realizadas = tipar_historico(pd.concat(operacoes_realizadas, ignore_index=True))
 
     # 📆 ANÁLISE DO DIA
     with tab2:
         st.subheader("📆 Resultado de Hoje (Horário da Binance - UTC)")
 
         hoje_utc = datetime.now(timezone.utc).date()
-        df_hoje = df_realizadas[df_realizadas["Data"] == hoje_utc]
-        lucro_hoje = df_hoje["pnl_num"].sum()
-        lucro_medio_hoje = df_hoje["pnl_num"].mean() if not df_hoje.empty else 0.0
+        inicio_dia_ms = int(datetime(hoje_utc.year, hoje_utc.month, hoje_utc.day, tzinfo=timezone.utc).timestamp() * 1000)
+        df_hoje = df_realizadas[df_realizadas["time"] >= inicio_dia_ms]
+        lucro_hoje = df_hoje["PnL USDT"].sum()
+        lucro_medio_hoje = df_hoje["PnL USDT"].mean() if not df_hoje.empty else 0.0
         progresso = min(max(lucro_hoje / meta_dia, 0.0), 1.0)  # <-- Correção aplicada aqui
 
         st.markdown(f"🎯 **Meta diária:** ${meta_dia:.2f}")
@@ -120,43 +275,49 @@ if all_trades:
 
         if ordens_abertas:
             st.subheader("📌 Ordens Abertas (Pendentes na Binance)")
-            df_abertas = pd.DataFrame(ordens_abertas)
+            df_abertas = pd.DataFrame(ordens_abertas).rename(columns={
+                "conta": "Conta", "symbol": "Ativo", "side": "Tipo", "origQty": "Qtd",
+                "executedQty": "Executado", "price": "Preço", "status": "Status", "time": "Criada em",
+            })
+            df_abertas["No livro há (min)"] = (datetime.now(timezone.utc).timestamp() * 1000 - df_abertas["Criada em"]) / 60000
             df_abertas["Criada em"] = pd.to_datetime(df_abertas["Criada em"], unit="ms")
-            df_abertas = df_abertas[["Ativo", "Tipo", "Qtd", "Preço", "Status", "Criada em"]]
-            st.dataframe(df_abertas, use_container_width=True)
+            df_abertas = df_abertas[["Conta", "Ativo", "Tipo", "Qtd", "Executado", "Preço", "Status", "Criada em", "No livro há (min)"]]
+            st.dataframe(df_abertas, use_container_width=True, column_config=COLUNAS_ORDENS)
         else:
             st.info("✅ Não há ordens pendentes no momento.")
 
+        if eventos_ordens:
+            st.subheader("🔁 Ciclo de Vida das Ordens Hoje")
+            df_eventos = pd.DataFrame(eventos_ordens)
+            executadas = df_eventos[df_eventos["event"] == "executada"]
+            col6, col7, col8 = st.columns(3)
+            col6.metric("🆕 Novas", int((df_eventos["event"] == "nova").sum()))
+            col7.metric("✅ Executadas / ❌ Canceladas", f"{len(executadas)} / {int((df_eventos['event'] == 'cancelada').sum())}")
+            col8.metric(
+                "⏱️ Tempo mediano até execução",
+                f"{executadas['timeInBook'].median() / 60000:.1f} min" if not executadas.empty else "-",
+            )
+            df_eventos = df_eventos.rename(columns={
+                "conta": "Conta", "time": "Quando", "event": "Evento", "symbol": "Ativo", "side": "Tipo",
+                "origQty": "Qtd", "executedQty": "Executado", "price": "Preço", "timeInBook": "No livro (min)",
+            })
+            df_eventos["Quando"] = pd.to_datetime(df_eventos["Quando"], unit="ms")
+            df_eventos["No livro (min)"] = df_eventos["No livro (min)"] / 60000
+            st.dataframe(
+                df_eventos[["Conta", "Quando", "Evento", "Ativo", "Tipo", "Qtd", "Executado", "Preço", "No livro (min)"]],
+                use_container_width=True, hide_index=True, column_config=COLUNAS_ORDENS,
+            )
+
         st.divider()
         st.subheader("📘 Histórico de Trades do Dia")
-        st.dataframe(df_hoje, use_container_width=True)
+        _tabela_de_trades(df_hoje, "trades_hoje")
     with tab1:
         st.subheader("💰 Visão Consolidada da Carteira (Saldo Estimado)")
 
         hoje_utc = datetime.now(timezone.utc).date()
-        hoje_str = hoje_utc.strftime("%Y-%m-%d")
-
-        ativos_detalhados = []
-        saldo_estimado_atual = 0.0
-
-        for symbol, estrategia in ativos.items():
-            token = symbol.replace("USDT", "")
-            preco_atual = get_price(symbol)
-            saldo_token = get_real_balance(token)
-            valor_atual = saldo_token * preco_atual
 
-            # PnL diário segundo a regra da Binance
-            _, pnl_token_hoje = calculate_daily_pnl(token, saldo_token, preco_atual)
-
-            saldo_estimado_atual += valor_atual
-
-            ativos_detalhados.append({
-                "Ativo": token,
-                "Qtd": round(saldo_token, 6),
-                "Preço Atual": round(preco_atual, 4),
-                "Valor Atual (USDT)": round(valor_atual, 2),
-                "PnL do Dia (USDT)": round(pnl_token_hoje, 2)
-            })
+        ativos_detalhados = painel["ativos_detalhados"]
+        saldo_estimado_atual = sum(x["Valor Atual (USDT)"] for x in ativos_detalhados)
 
         saldo_estimado_atual += usdt_saldo
         pnl_total = sum([x["PnL do Dia (USDT)"] for x in ativos_detalhados])
@@ -164,44 +325,118 @@ if all_trades:
         # Indicadores principais
         st.metric("💰 Saldo Estimado Atual", f"${saldo_estimado_atual:.2f}")
         st.caption(f"📊 PnL do Dia (modo Binance): ${pnl_total:+.2f}")
+
+        transferencias = painel["transferencias"]
+        if transferencias["status"] == "falhou":
+            st.warning(f"⚠️ Falha ao atualizar depósitos/saques; o PnL do dia usa os últimos dados conhecidos. ({transferencias['error']})")
+        elif transferencias["status"] != "ok":
+            st.warning(f"⚠️ Dados de depósitos/saques {transferencias['status']}; o PnL do dia pode não refletir transferências recentes.")
         st.metric("💵 USDT Disponível", f"${usdt_saldo:.2f}")
 
         # Detalhamento por token
         st.subheader("🔍 Detalhamento dos Ativos e PnL do Dia")
         df_ativos = pd.DataFrame(ativos_detalhados)
         df_ativos = df_ativos.sort_values(by="PnL do Dia (USDT)", ascending=False)
-        st.dataframe(df_ativos, use_container_width=True)
+        st.dataframe(df_ativos, use_container_width=True, column_config=COLUNAS_ATIVOS)
 
         # Ativos com prejuízo
         df_perdas = df_ativos[df_ativos["PnL do Dia (USDT)"] < 0]
         if not df_perdas.empty:
             st.subheader("❌ Ativos com Prejuízo Hoje")
-            st.dataframe(df_perdas, use_container_width=True)
+            st.dataframe(df_perdas, use_container_width=True, column_config=COLUNAS_ATIVOS)
         else:
             st.success("✅ Nenhum ativo com prejuízo hoje.")
 
-        # Gráfico PnL por ativo
+        # Gráfico PnL por ativo (somado entre as contas)
         st.subheader("📈 PnL do Dia por Ativo")
-        st.bar_chart(df_ativos.set_index("Ativo")["PnL do Dia (USDT)"])
+        st.bar_chart(df_ativos.groupby("Ativo")["PnL do Dia (USDT)"].sum())
 
         # Gráfico de distribuição da carteira
         st.subheader("📊 Distribuição da Carteira (em USDT)")
         df_dist = df_ativos[["Ativo", "Valor Atual (USDT)"]].copy()
-        df_dist.loc[len(df_dist.index)] = ["USDT", round(usdt_saldo, 2)]
-        df_dist = df_dist.sort_values(by="Valor Atual (USDT)", ascending=False)
-        st.bar_chart(df_dist.set_index("Ativo")["Valor Atual (USDT)"])
-
-        # Evolução do saldo estimado (em sessão)
-        if "evolucao_saldo" not in st.session_state:
-            st.session_state["evolucao_saldo"] = {}
-        st.session_state["evolucao_saldo"][hoje_str] = saldo_estimado_atual
-
-        df_evolucao = pd.DataFrame([
-            {"Data": k, "Saldo Estimado": v}
-            for k, v in st.session_state["evolucao_saldo"].items()
-        ])
-        df_evolucao["Data"] = pd.to_datetime(df_evolucao["Data"])
-        df_evolucao = df_evolucao.sort_values("Data").set_index("Data")
+        df_dist.loc[len(df_dist.index)] = ["USDT", usdt_saldo]
+        st.bar_chart(df_dist.groupby("Ativo")["Valor Atual (USDT)"].sum().sort_values(ascending=False))
 
+        # Evolução do saldo estimado (rollups diários persistidos)
         st.subheader("📈 Evolução Diária do Saldo Estimado")
-        st.line_chart(df_evolucao["Saldo Estimado"])
+        periodo = st.radio("Período", [30, 90, 365], format_func=lambda d: f"{d} dias", horizontal=True)
+        _contar("rollups")
+        df_evolucao = _resumo_em_cache(list(contas), hoje_utc - timedelta(days=periodo - 1), hoje_utc)
+
+        if df_evolucao.empty:
+            st.info("⏳ Rollups diários ainda não calculados.")
+        else:
+            # Séries reduzidas no servidor: o gráfico recebe no máximo MAX_PONTOS_GRAFICO pontos
+            st.line_chart(view_layer.reduzir(df_evolucao["Saldo Estimado"]))
+            st.subheader("📊 PnL Diário")
+            st.bar_chart(view_layer.reduzir(df_evolucao[["PnL Realizado", "PnL do Dia (Binance)"]], metodo="minmax"))
+
+        st.subheader("📈 PnL Realizado Acumulado")
+        df_operacoes = df_realizadas[df_realizadas["Tipo"] != "Posição Atual"].sort_values("time", kind="mergesort")
+        if df_operacoes.empty:
+            st.info("Nenhuma operação realizada ainda.")
+        else:
+            pnl_acumulado = df_operacoes["PnL USDT"].cumsum()
+            pnl_acumulado.index = pd.to_datetime(df_operacoes["time"], unit="ms")
+            st.line_chart(view_layer.reduzir(pnl_acumulado.rename("PnL Acumulado")))
+
+        st.subheader("📚 Histórico Completo de Trades")
+        _tabela_de_trades(df_full, "trades_completo")
+
+with st.expander("🛠️ Depuração: cache do painel"):
+    stats = _estatisticas_cache()
+    with stats["lock"]:
+        nomes = sorted(set(stats["chamadas"]) | set(stats["misses"]))
+        df_cache = pd.DataFrame([{
+            "Cache": nome,
+            "Chamadas": stats["chamadas"][nome],
+            "Misses": stats["misses"][nome],
+            "Hits": max(stats["chamadas"][nome] - stats["misses"][nome], 0),
+        } for nome in nomes])
+    if df_cache.empty:
+        st.caption("Nenhuma chamada em cache registrada neste processo.")
+    else:
+        st.dataframe(df_cache, use_container_width=True, hide_index=True)
+    if st.button("🧹 Limpar cache de dados"):
+        st.cache_data.clear()
+        st.rerun()
+
+with st.expander("🩺 Diagnóstico: latência, peso e erros"):
+    # No modo coletor as métricas são as do processo coletor, publicadas com o painel
+    dados_metricas = painel.get("metricas") if FONTE_COLETOR else metrics.snapshot()
+    if not dados_metricas or not dados_metricas["histogramas"]:
+        st.caption("Nenhuma métrica registrada ainda.")
+    else:
+        medidores = {n: v for n, _, v in dados_metricas["medidores"]}
+        if "binance_peso_usado_1m" in medidores:
+            st.metric("⚖️ Peso usado no último minuto (Binance)", f"{medidores['binance_peso_usado_1m']:.0f}")
+        st.dataframe(
+            pd.DataFrame(metrics.resumo(dados_metricas)),
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "Média (ms)": st.column_config.NumberColumn(format="%.1f"),
+                "p50 (ms)": st.column_config.NumberColumn(format="%.0f"),
+                "p95 (ms)": st.column_config.NumberColumn(format="%.0f"),
+                "Total (s)": st.column_config.NumberColumn(format="%.2f"),
+            },
+        )
+        st.download_button(
+            "⬇️ Métricas (Prometheus)", metrics.exportar_prometheus(dados_metricas), file_name="metrics.txt"
+        )
+
+    # Disjuntores por endpoint da Binance (do coletor, no modo coletor)
+    if FONTE_COLETOR:
+        disjuntores = painel.get("disjuntores", {})
+    else:
+        import resilience
+        disjuntores = resilience.breaker_states()
+    if disjuntores:
+        st.dataframe(
+            pd.DataFrame(
+                [(nome, estado, falhas) for nome, (estado, falhas) in sorted(disjuntores.items())],
+                columns=["Endpoint", "Disjuntor", "Falhas seguidas"],
+            ),
+            use_container_width=True,
+            hide_index=True,
+        )
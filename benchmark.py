@@ -0,0 +1,227 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+
+# Tamanhos de histórico (quantidade de fills) medidos por padrão
+TAMANHOS = (1_000, 100_000, 1_000_000)
+
+# Arquivo com os tempos e picos de memória de referência
+BASELINE_FILE = os.getenv("BENCHMARK_BASELINE", os.path.join("benchmarks", "baseline.json"))
+
+# Piora aceita em relação à referência antes de acusar regressão (0.25 = 25%)
+TOLERANCIA = float(os.getenv("BENCHMARK_TOLERANCE", "0.25"))
+
+# Diferenças absolutas abaixo destas não contam como regressão (ruído de medição
+# de uma máquina compartilhada: agendador, GC e cache de disco)
+FOLGA_MINIMA = {"tempo_s": 0.025, "memoria_mb": 2.0}
+
+# Execuções por caso; vale a mediana, estável frente a execuções atípicas
+REPETICOES = 15
+
+# Dias máximos reconstruídos no caso do rollup diário
+ROLLUP_DIAS = 365
+
+# Maior histórico medido no rollup diário: com 1 milhão de fills cada execução
+# leva dezenas de segundos, inviável com REPETICOES
+ROLLUP_TAMANHO_MAXIMO = 100_000
+
+# Execuções da inicialização a frio (cada uma é um processo novo, bem mais lento)
+REPETICOES_INICIALIZACAO = 7
+
+# Inicialização a frio, cada execução em um processo novo: import do caminho
+# de linha de comando e import mais primeira renderização do painel
+INICIALIZACAO = {
+    "inicializacao_cli": "import verificar_queda",
+    "inicializacao_painel": (
+        "from streamlit.testing.v1 import AppTest\n"
+        "at = AppTest.from_file('app.py', default_timeout=300).run()\n"
+        "assert not at.exception, at.exception"
+    ),
+}
+
+# Ao fim do processo medido, imprime o pico de memória residente (MB)
+_PICO_RSS = "\nimport resource\nprint(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)"
+
+
+def _preparar_ambiente():
+    """Isola o benchmark: cliente sintético e banco temporário, sem rede nem dados reais."""
+    os.environ["BINANCE_CLIENT_MODE"] = "synthetic"
+    os.environ["BINANCE_DB_FILE"] = os.path.join(tempfile.mkdtemp(prefix="benchmark_"), "benchmark.db")
+
+
+def _medir(func, repeticoes):
+    """Mediana do tempo de parede entre as repetições e pico de memória (MB) de uma execução à parte."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func()
+        tempos.append(time.perf_counter() - inicio)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return statistics.median(tempos), pico / 1024 / 1024
+
+
+def _casos(n):
+    """
+    Monta as funções medidas para um histórico sintético de `n` fills
+    (preparação fora da medição). Cada tamanho usa um banco próprio, já com
+    os trades, o histórico calculado e os candles e transferências do
+    período, para que o rollup meça só a reconstrução; acima de
+    ROLLUP_TAMANHO_MAXIMO o rollup fica de fora.
+    """
+    import pandas as pd
+
+    import daily_rollup
+    import fake_client
+    import position_checkpoint
+    import storage
+    import trade_store
+    from storytelling_calculator import processar_trades_completos
+    from verificar_queda import calcular_entrada_liquida_e_qtd
+
+    storage.DB_FILE = os.path.join(tempfile.mkdtemp(prefix="benchmark_"), f"benchmark_{n}.db")
+    cliente = fake_client.SyntheticClient(["XRPUSDT"], n_trades=n)
+    # Histórico terminando agora: parte dos fills cai no dia corrente
+    arrays = cliente._par("XRPUSDT")
+    df_orders = pd.DataFrame(arrays)
+    df_price = pd.DataFrame({"symbol": ["XRPUSDT"], "current_price": [float(arrays["price"][-1])]})
+    trades = trade_store.to_columns(fake_client.trades_para_api(arrays))
+
+    casos = [
+        ("processar_trades_completos", lambda: processar_trades_completos(df_orders, df_price, "Benchmark")),
+        ("calcular_entrada_liquida_e_qtd", lambda: calcular_entrada_liquida_e_qtd(trades)),
+    ]
+    if n > ROLLUP_TAMANHO_MAXIMO:
+        return casos
+
+    trade_store.save_trades("XRPUSDT", trades)
+    position_checkpoint.atualizar_checkpoint("XRPUSDT", "Benchmark")
+    ativos = {"XRPUSDT": "Benchmark"}
+    saldos = {b["asset"]: (float(b["free"]), float(b["locked"])) for b in cliente.get_account()["balances"]}
+    precos = {"XRPUSDT": float(arrays["price"][-1])}
+    # Rollup de todo o histórico (até ROLLUP_DIAS): o período cresce com a quantidade de fills
+    hoje = daily_rollup._today()
+    primeiro_dia = pd.Timestamp(int(arrays["time"][0]), unit="ms").date()
+    inicio = max(primeiro_dia, hoje - timedelta(days=ROLLUP_DIAS))
+
+    def rollup():
+        return daily_rollup.rebuild(cliente, ativos, saldos, precos, inicio, force=True)
+
+    rollup()  # candles e transferências do período ficam no banco antes da medição
+    casos.insert(1, ("daily_rollup.rebuild", rollup))
+    return casos
+
+
+def _medir_inicializacao(codigo, repeticoes):
+    """Mediana do tempo de parede (interpretador incluso) e maior pico de RSS (MB) entre processos novos."""
+    tempos, picos = [], []
+    for _ in range(repeticoes):
+        # Banco novo a cada execução: a primeira renderização não aproveita caches de outra
+        env = dict(os.environ, BINANCE_DB_FILE=os.path.join(tempfile.mkdtemp(prefix="benchmark_"), "benchmark.db"))
+        inicio = time.perf_counter()
+        saida = subprocess.run(
+            [sys.executable, "-c", codigo + _PICO_RSS], env=env, capture_output=True, text=True, check=True,
+        )
+        tempos.append(time.perf_counter() - inicio)
+        picos.append(float(saida.stdout.strip().splitlines()[-1]))
+    return statistics.median(tempos), max(picos)
+
+
+def executar_inicializacao(repeticoes=REPETICOES_INICIALIZACAO):
+    """Mede a inicialização a frio e retorna {"inicializacao_*": {"tempo_s", "memoria_mb"}}."""
+    resultados = {}
+    for chave, codigo in INICIALIZACAO.items():
+        tempo, memoria = _medir_inicializacao(codigo, repeticoes)
+        resultados[chave] = {"tempo_s": round(tempo, 6), "memoria_mb": round(memoria, 3)}
+        print(f"{chave:<45} {tempo * 1000:>10.2f} ms {memoria:>10.2f} MB")
+    return resultados
+
+
+def executar(tamanhos=TAMANHOS, repeticoes=REPETICOES):
+    """Executa todos os casos e retorna {"caso[n]": {"tempo_s", "memoria_mb"}}."""
+    resultados = {}
+    for n in tamanhos:
+        for nome, func in _casos(n):
+            tempo, memoria = _medir(func, repeticoes)
+            chave = f"{nome}[{n}]"
+            resultados[chave] = {"tempo_s": round(tempo, 6), "memoria_mb": round(memoria, 3)}
+            print(f"{chave:<45} {tempo * 1000:>10.2f} ms {memoria:>10.2f} MB")
+    return resultados
+
+
+def comparar(resultados, referencia, tolerancia=TOLERANCIA):
+    """
+    Lista as regressões: tempo ou memória acima da referência mais a
+    tolerância relativa e mais que FOLGA_MINIMA em valor absoluto.
+    """
+    regressoes = []
+    for chave, atual in resultados.items():
+        base = referencia.get(chave)
+        if base is None:
+            continue
+        for metrica in ("tempo_s", "memoria_mb"):
+            limite = base[metrica] + max(base[metrica] * tolerancia, FOLGA_MINIMA[metrica])
+            if atual[metrica] > limite:
+                regressoes.append(f"{chave} {metrica}: {atual[metrica]} > {base[metrica]} (+{tolerancia:.0%})")
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dos motores de PnL e posição sobre históricos sintéticos.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=list(TAMANHOS), help="quantidades de fills")
+    parser.add_argument(
+        "--repeticoes", type=int, help=f"execuções por caso (padrão: {REPETICOES}; {REPETICOES_INICIALIZACAO} na inicialização)"
+    )
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="arquivo JSON de referência")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    parser.add_argument("--salvar", action="store_true", help="grava os resultados como nova referência")
+    parser.add_argument(
+        "--inicializacao", action="store_true", help="mede a inicialização a frio (CLI e primeira renderização do painel)"
+    )
+    args = parser.parse_args(argv)
+
+    _preparar_ambiente()
+    if args.inicializacao:
+        resultados = executar_inicializacao(args.repeticoes or REPETICOES_INICIALIZACAO)
+    else:
+        resultados = executar(args.tamanhos, args.repeticoes or REPETICOES)
+
+    if args.salvar:
+        referencia = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r") as f:
+                referencia = json.load(f)
+        referencia.update(resultados)
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(referencia, f, indent=2, sort_keys=True)
+        print(f"💾 Referência gravada em {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"⚠️ Sem referência em {args.baseline}; rode com --salvar para criá-la.")
+        return 0
+
+    with open(args.baseline, "r") as f:
+        regressoes = comparar(resultados, json.load(f), args.tolerancia)
+    for r in regressoes:
+        print(f"[Erro] regressão: {r}")
+    if not regressoes:
+        print("✅ Sem regressões em relação à referência.")
+    return 1 if regressoes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,78 +1,463 @@
+import json
 import os
+import threading
+import time
 from dotenv import load_dotenv
-from binance.client import Client
-from datetime import datetime, timezone, timedelta
+
+import candle_store
+import metrics
+import portfolio
+import rate_limiter
+import resilience
+import trade_store
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 load_dotenv()
 
 API_KEY = os.getenv("BINANCE_API_KEY")
 API_SECRET = os.getenv("BINANCE_API_SECRET")
 
-client = Client(API_KEY, API_SECRET)
+# Conexões HTTP mantidas abertas por conta (uma por thread de coleta)
+HTTP_POOL_SIZE = int(os.getenv("BINANCE_HTTP_POOL_SIZE", os.getenv("COLLECTOR_MAX_WORKERS", "8")))
+
+# Peso de cada endpoint na contagem REQUEST_WEIGHT da Binance
+REQUEST_WEIGHTS = {
+    "get_my_trades": 20,
+    "get_account": 20,
+    "get_asset_balance": 20,
+    "get_symbol_ticker": 4,
+    "get_open_orders": 80,
+    "get_klines": 2,
+}
+
+# Novas tentativas de uma chamada que recebeu 429
+RATE_LIMIT_RETRIES = 3
+
+# Timeout (segundos) por endpoint; os demais usam REQUEST_TIMEOUT
+REQUEST_TIMEOUT = float(os.getenv("BINANCE_REQUEST_TIMEOUT", "10"))
+ENDPOINT_TIMEOUTS = {
+    "get_symbol_ticker": 5,
+    "get_account": 10,
+    "get_open_orders": 10,
+    "get_klines": 10,
+    "get_my_trades": 15,
+    "get_deposit_history": 20,
+    "get_withdraw_history": 20,
+}
+
+# Endpoints assinados, cujo timestamp depende do relógio alinhado com o da Binance
+SIGNED_METHODS = {
+    "get_account", "get_asset_balance", "get_my_trades", "get_open_orders",
+    "get_deposit_history", "get_withdraw_history",
+}
+
+# Intervalo entre ressincronizações do relógio com o servidor, em segundos
+TIME_SYNC_INTERVAL = float(os.getenv("BINANCE_TIME_SYNC_INTERVAL", "3600"))
+
+
+def _request_weight(method, params):
+    if method == "get_open_orders" and "symbol" in params:
+        return 6
+    if method == "get_symbol_ticker" and "symbol" in params:
+        return 2
+    return REQUEST_WEIGHTS.get(method, 1)
+
+
+class RateLimitedClient:
+    """
+    Envolve o Client da python-binance: toda chamada get_* consome o peso
+    correspondente do balde compartilhado entre threads e é repetida após
+    um 429, respeitando a pausa imposta pela Binance.
+
+    Com o cliente real (`raw`), cada endpoint tem seu timeout, falhas
+    transitórias (timeout, conexão, 5xx) são repetidas com backoff e jitter,
+    o relógio é alinhado ao do servidor para as chamadas assinadas e um
+    disjuntor por endpoint recusa chamadas enquanto ele estiver falhando.
+
+    Cada tentativa alimenta as métricas de latência, peso, novas tentativas
+    e erros por método (módulo `metrics`).
+    """
+
+    def __init__(self, client, raw=None):
+        self._client = client
+        self._raw = raw
+        self._time_synced = None
+        self._time_lock = threading.Lock()
+
+    def sync_time(self):
+        """Mede o deslocamento entre o relógio local e o da Binance e o aplica às chamadas assinadas."""
+        rate_limiter.bucket.acquire(1)
+        antes = time.time() * 1000
+        servidor = self._raw.get_server_time()["serverTime"]
+        depois = time.time() * 1000
+        self._raw.timestamp_offset = int(servidor - (antes + depois) / 2)
+        self._time_synced = time.monotonic()
+        metrics.definir("binance_desvio_relogio_ms", self._raw.timestamp_offset)
+        return self._raw.timestamp_offset
+
+    def _ensure_time_synced(self, name, forcar=False):
+        if self._raw is None or name not in SIGNED_METHODS:
+            return
+        with self._time_lock:
+            if not forcar and self._time_synced is not None and time.monotonic() - self._time_synced < TIME_SYNC_INTERVAL:
+                return
+            try:
+                self.sync_time()
+            except Exception as e:
+                # Sem o horário do servidor, segue com o relógio local até a próxima janela
+                self._time_synced = time.monotonic()
+                print("[Erro] sincronizar relógio com a Binance:", e)
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or not name.startswith("get_"):
+            return attr
+
+        def call(*args, **params):
+            weight = _request_weight(name, params)
+            if self._raw is not None:
+                params.setdefault("requests_params", {"timeout": ENDPOINT_TIMEOUTS.get(name, REQUEST_TIMEOUT)})
+
+            disjuntor = resilience.breaker(name)
+            try:
+                disjuntor.before_call(name)
+            except resilience.CircuitOpenError:
+                metrics.incrementar("binance_disjuntor_recusas_total", metodo=name)
+                raise
+
+            tentativa = 0
+            while True:
+                if tentativa:
+                    metrics.incrementar("binance_tentativas_extras_total", metodo=name)
+                self._ensure_time_synced(name)
+                rate_limiter.bucket.acquire(weight)
+                metrics.incrementar("binance_peso_total", weight, metodo=name)
+                inicio = time.perf_counter()
+                try:
+                    resposta = attr(*args, **params)
+                except Exception as e:
+                    metrics.observar("binance_requisicao_segundos", time.perf_counter() - inicio, metodo=name)
+                    limite_429 = resilience.is_rate_limited(e)
+                    if limite_429 and tentativa < RATE_LIMIT_RETRIES:
+                        # O balde já está bloqueado pelo Retry-After informado pela Binance
+                        tentativa += 1
+                        continue
+                    if resilience.is_clock_drift(e) and self._raw is not None and tentativa < resilience.MAX_RETRIES:
+                        tentativa += 1
+                        self._ensure_time_synced(name, forcar=True)
+                        continue
+                    if resilience.is_transient(e) and tentativa < resilience.MAX_RETRIES:
+                        tentativa += 1
+                        time.sleep(resilience.backoff_delay(tentativa))
+                        continue
+                    metrics.incrementar("binance_erros_total", metodo=name)
+                    if limite_429 or resilience.is_transient(e):
+                        disjuntor.record_failure()
+                    else:
+                        # Erro de negócio (4xx): o endpoint respondeu normalmente
+                        disjuntor.record_success()
+                    metrics.definir("binance_disjuntor_aberto", disjuntor.state != "fechado", metodo=name)
+                    raise
+                metrics.observar("binance_requisicao_segundos", time.perf_counter() - inicio, metodo=name)
+                disjuntor.record_success()
+                metrics.definir("binance_disjuntor_aberto", 0, metodo=name)
+                return resposta
+
+        return call
+
+
+def _decodificar_resposta(response):
+    """
+    Substitui `Client._handle_response` da python-binance: mesma validação,
+    com o JSON decodificado por orjson direto dos bytes da resposta quando
+    instalado (com json da biblioteca padrão como alternativa).
+    """
+    from binance.exceptions import BinanceAPIException, BinanceRequestException
+
+    if not (200 <= response.status_code < 300):
+        raise BinanceAPIException(response, response.status_code, response.text)
+    if not response.content:
+        return {}
+    try:
+        return orjson.loads(response.content) if orjson is not None else json.loads(response.content)
+    except ValueError:
+        raise BinanceRequestException("Invalid Response: %s" % response.text)
+
+
+def _resposta_por_thread(Client):
+    """
+    Subclasse do Client da python-binance em que `response` é guardado por
+    thread: `Client._request` grava a resposta em `self.response` e só
+    depois a lê, então threads compartilhando o cliente (e seu pool de
+    conexões) poderiam trocar respostas entre si.
+    """
+    class ClientePorThread(Client):
+        @property
+        def response(self):
+            return getattr(self.__dict__.setdefault("_respostas", threading.local()), "valor", None)
+
+        @response.setter
+        def response(self, valor):
+            self.__dict__.setdefault("_respostas", threading.local()).valor = valor
+
+    return ClientePorThread
+
+
+def _criar_cliente(conta):
+    """
+    Cria o cliente de uma conta com sessão HTTP própria, cujo pool comporta
+    as threads de coleta sem abrir e fechar conexões a cada requisição.
+
+    Com BINANCE_CLIENT_MODE=replay ou synthetic o cliente é o de
+    `fake_client`, sem rede; com record, as respostas reais são gravadas.
+
+    A python-binance (cujo import é lento) só é carregada aqui, e o Client
+    faz um ping na Binance ao ser construído.
+    """
+    import fake_client
+
+    contas = portfolio.carregar_portfolio()
+    offline = fake_client.criar_cliente_offline(conta, contas.get(conta, {}).get("ativos", {}))
+    if offline is not None:
+        return RateLimitedClient(offline)
+
+    from binance.client import Client
+    from requests.adapters import HTTPAdapter
+
+    raw = _resposta_por_thread(Client)(*portfolio.credenciais(conta, contas))
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    raw.session.mount("https://", adapter)
+    rate_limiter.install(raw)
+    raw._handle_response = _decodificar_resposta
+    return RateLimitedClient(fake_client.gravar(raw, conta), raw=raw)
+
+
+# Clientes por conta, compartilhados pelo processo; nenhum é criado no import
+_clientes = {}
+_clientes_lock = threading.Lock()
+
+
+def get_account_client(conta=None):
+    """
+    Cliente da conta (por padrão, a do contexto atual), criado na primeira
+    utilização com as credenciais indicadas no portfólio e reaproveitado
+    por todas as threads do processo. O peso das requisições continua
+    limitado pelo balde único, já que o limite da Binance é por IP.
+    """
+    conta = conta or portfolio.conta_atual()
+    cliente = _clientes.get(conta)
+    if cliente is None:
+        with _clientes_lock:
+            cliente = _clientes.get(conta)
+            if cliente is None:
+                cliente = _clientes[conta] = _criar_cliente(conta)
+    return cliente
+
+
+class _ClienteDaConta:
+    """Encaminha cada acesso ao cliente da conta selecionada com `portfolio.usar_conta`."""
+
+    def __getattr__(self, name):
+        return getattr(get_account_client(), name)
+
+
+client = _ClienteDaConta()
+
+# Validade (segundos) do snapshot da conta compartilhado pelas consultas de saldo
+ACCOUNT_SNAPSHOT_TTL = float(os.getenv("ACCOUNT_SNAPSHOT_TTL", "10"))
+
+# Validade (segundos) do cache de preços compartilhado pelo painel
+PRICE_TTL = float(os.getenv("PRICE_TTL", "5"))
+
+# Snapshots de saldo por conta; os preços são públicos e compartilhados entre as contas
+_account_snapshots = {}
+_account_lock = threading.Lock()
+
+_price_cache = {"time": 0.0, "prices": {}}
+_price_lock = threading.Lock()
+
+# Últimas ordens abertas obtidas pelo REST, por conta e par (None = todos)
+_open_orders_cache = {}
+
+# Fontes servidas do último dado bom após uma falha: {(conta, fonte): (desde, erro)}
+_stale = {}
+_stale_lock = threading.Lock()
+
+# Estado mantido pelos WebSockets (stream_state) por conta; quando ativo, substitui o REST
+_streams = {}
+
+def attach_stream(state, conta=None):
+    """Registra o estado de streaming da conta consultado antes das chamadas REST."""
+    _streams[conta or portfolio.conta_atual()] = state
+
+def _stream():
+    return _streams.get(portfolio.conta_atual())
+
+def _stream_live(user_data=False):
+    stream = _stream()
+    return stream is not None and stream.live and (stream.user_stream or not user_data)
+
+def _com_reserva(fonte, buscar, reserva):
+    """
+    Executa `buscar()`. Se falhar (inclusive com o disjuntor aberto) e houver
+    `reserva` — o último dado bom —, devolve-a e marca a fonte como
+    desatualizada para a conta atual; sem reserva, repassa a exceção.
+    Um sucesso limpa a marcação.
+    """
+    chave = (portfolio.conta_atual(), fonte)
+    try:
+        dados = buscar()
+    except Exception as e:
+        if reserva is None:
+            raise
+        with _stale_lock:
+            desde = _stale[chave][0] if chave in _stale else time.time()
+            _stale[chave] = (desde, str(e))
+        metrics.incrementar("binance_reserva_servida_total", fonte=fonte)
+        print(f"[Erro] {fonte}: usando o último dado bom ({e})")
+        return reserva
+    with _stale_lock:
+        _stale.pop(chave, None)
+    return dados
+
+def fontes_desatualizadas(conta=None):
+    """Fontes da conta servidas do último dado bom: {fonte: {"desde": timestamp, "erro": str}}."""
+    conta = conta or portfolio.conta_atual()
+    with _stale_lock:
+        return {f: {"desde": desde, "erro": erro} for (c, f), (desde, erro) in _stale.items() if c == conta}
+
+def sync_trades(symbol):
+    """
+    Busca apenas os trades novos do par e grava no armazenamento local.
+    Se a busca falhar e o par já tiver trades armazenados, segue com eles
+    (nenhum trade novo) e marca a fonte "trades <par>" como desatualizada.
+    """
+    if _stream_live(user_data=True) and symbol in _stream().symbols:
+        # Os trades do par chegam pelo stream de usuário
+        return 0
+    reserva = 0 if trade_store.last_trade_id(symbol) is not None else None
+    return _com_reserva(f"trades {symbol}", lambda: trade_store.sync_trades(client, symbol), reserva)
 
 def get_trades(symbol):
-    return client.get_my_trades(symbol=symbol)
+    """
+    Sincroniza os trades novos do par no armazenamento local e
+    retorna o histórico completo a partir dele.
+    """
+    sync_trades(symbol)
+    return trade_store.load_trades(symbol)
+
+def refresh_prices():
+    """
+    Busca o preço de todos os pares em uma única requisição e atualiza o cache.
+    Em caso de falha, devolve os últimos preços conhecidos (fonte "preços"
+    desatualizada) sem renovar a validade do cache.
+    """
+    def buscar():
+        tickers = client.get_symbol_ticker()
+        prices = {t["symbol"]: float(t["price"]) for t in tickers}
+        with _price_lock:
+            _price_cache["prices"] = prices
+            _price_cache["time"] = time.time()
+        return prices
+
+    with _price_lock:
+        reserva = _price_cache["prices"] or None
+    return _com_reserva("preços", buscar, reserva)
+
+def get_prices(symbols, max_age=PRICE_TTL):
+    """
+    Retorna {symbol: preço} para os pares pedidos a partir do cache de tickers,
+    renovando-o quando está mais velho que `max_age` ou não cobre algum par.
+    """
+    if _stream_live():
+        prices = _stream().get_prices(symbols)
+        if prices is not None:
+            return prices
+    with _price_lock:
+        prices = _price_cache["prices"]
+        fresh = time.time() - _price_cache["time"] <= max_age
+    if not fresh or any(s not in prices for s in symbols):
+        prices = refresh_prices()
+    return {s: prices[s] for s in symbols}
 
 def get_price(symbol):
-    ticker = client.get_symbol_ticker(symbol=symbol)
-    return float(ticker["price"])
+    return get_prices([symbol])[symbol]
+
+def refresh_account_snapshot():
+    """
+    Busca a conta uma única vez e indexa os saldos por ativo: {asset: (free, locked)}.
+    Em caso de falha, devolve o último snapshot da conta (fonte "conta"
+    desatualizada), que continua vencido e é buscado de novo na próxima consulta.
+    """
+    conta = portfolio.conta_atual()
+
+    def buscar():
+        info = client.get_account()
+        balances = {
+            b["asset"]: (float(b["free"]), float(b["locked"]))
+            for b in info["balances"]
+        }
+        with _account_lock:
+            _account_snapshots[conta] = {"time": time.time(), "balances": balances}
+        return balances
+
+    with _account_lock:
+        snapshot = _account_snapshots.get(conta)
+    return _com_reserva("conta", buscar, snapshot["balances"] if snapshot else None)
+
+def get_account_snapshot(max_age=ACCOUNT_SNAPSHOT_TTL):
+    """Retorna o índice de saldos, renovando-o apenas se estiver mais velho que `max_age`."""
+    if _stream_live(user_data=True):
+        return _stream().get_balances()
+    with _account_lock:
+        snapshot = _account_snapshots.get(portfolio.conta_atual())
+    if snapshot is not None and time.time() - snapshot["time"] <= max_age:
+        return snapshot["balances"]
+    return refresh_account_snapshot()
 
 def get_balance(asset):
+    """
+    Retorna (free, locked) do ativo, ou None se a conta nunca pôde ser lida:
+    um saldo desconhecido não deve ser confundido com saldo zero.
+    """
     try:
-        balance_info = client.get_asset_balance(asset=asset)
-        if balance_info:
-            free = float(balance_info.get("free", 0))
-            locked = float(balance_info.get("locked", 0))
-            return free, locked
-        return 0.0, 0.0
+        return get_account_snapshot().get(asset, (0.0, 0.0))
     except Exception as e:
         print(f"[Erro] get_balance({asset}):", e)
-        return 0.0, 0.0
+        return None
     
 def get_open_orders(symbol=None):
-    if symbol:
-        return client.get_open_orders(symbol=symbol)
-    return client.get_open_orders()
+    """Ordens abertas (do par ou da conta); após uma falha do REST, as últimas obtidas."""
+    if _stream_live(user_data=True):
+        return _stream().get_open_orders(symbol)
+    chave = (portfolio.conta_atual(), symbol)
+
+    def buscar():
+        ordens = client.get_open_orders(symbol=symbol) if symbol else client.get_open_orders()
+        _open_orders_cache[chave] = ordens
+        return ordens
+
+    return _com_reserva("ordens abertas", buscar, _open_orders_cache.get(chave))
 def get_opening_price(symbol):
+    """Preço de abertura do dia (00:00 UTC), servido pelo cache local de candles."""
     try:
-        agora = datetime.utcnow()
-        inicio_utc = agora.replace(hour=0, minute=0, second=0, microsecond=0)
-        start_ts = int(inicio_utc.timestamp() * 1000)
-
-        # Tenta buscar candle de hoje (00:00 UTC)
-        klines = client.get_klines(
-            symbol=symbol,
-            interval=Client.KLINE_INTERVAL_1HOUR,
-            startTime=start_ts,
-            limit=1
-        )
-        if klines:
-            return float(klines[0][1])
-
-        # Fallback: último candle disponível antes das 00:00
-        klines_fallback = client.get_klines(
-            symbol=symbol,
-            interval=Client.KLINE_INTERVAL_1HOUR,
-            limit=1
-        )
-        if klines_fallback:
-            return float(klines_fallback[0][1])
-
-        return None
+        return candle_store.get_day_open(client, symbol)
     except Exception as e:
         print(f"[Erro] get_opening_price({symbol}):", e)
         return None
 
 def get_real_balance(token):
     """
-    Retorna o saldo total (free + locked) exato do token, igual à interface da Binance.
+    Retorna o saldo total (free + locked) exato do token, igual à interface da Binance,
+    ou None se a conta nunca pôde ser lida.
     """
     try:
-        info = client.get_account()
-        for b in info["balances"]:
-            if b["asset"] == token:
-                return float(b["free"]) + float(b["locked"])
-        return 0.0
+        free, locked = get_account_snapshot().get(token, (0.0, 0.0))
+        return free + locked
     except Exception as e:
         print(f"[Erro] get_real_balance({token}):", e)
-        return 0.0
+        return None
@@ -0,0 +1,143 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import storage
+
+# Duração de cada intervalo de candle suportado, em ms
+INTERVAL_MS = {
+    "1h": 60 * 60 * 1000,
+    "1d": 24 * 60 * 60 * 1000,
+}
+
+# Tamanho máximo de página aceito pelo endpoint de klines
+PAGE_LIMIT = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS klines (
+    symbol TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    open_time INTEGER NOT NULL,
+    open REAL NOT NULL,
+    high REAL NOT NULL,
+    low REAL NOT NULL,
+    close REAL NOT NULL,
+    volume REAL NOT NULL,
+    close_time INTEGER NOT NULL,
+    closed INTEGER NOT NULL,
+    PRIMARY KEY (symbol, interval, open_time)
+)
+"""
+
+
+def _day_ms(day):
+    return int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _ms_day(ms):
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).date()
+
+
+def _stored(conn, symbol, interval, start_ms, end_ms):
+    rows = conn.execute(
+        """SELECT open_time, closed FROM klines
+           WHERE symbol = ? AND interval = ? AND open_time >= ? AND open_time <= ?""",
+        (symbol, interval, start_ms, end_ms),
+    ).fetchall()
+    return {r[0]: bool(r[1]) for r in rows}
+
+
+def _missing_ranges(expected, passo, stored, require_closed, agora):
+    """
+    Agrupa os open_time ausentes (ou gravados abertos, mas cujo período já
+    terminou) em faixas contíguas. O candle em andamento nunca está fechado,
+    então não é buscado de novo só por isso.
+    """
+    ranges = []
+    for t in expected:
+        if t in stored and (stored[t] or not require_closed or t + passo > agora):
+            continue
+        if ranges and ranges[-1][1] == t - passo:
+            ranges[-1][1] = t
+        else:
+            ranges.append([t, t])
+    return ranges
+
+
+def backfill(client, symbol, interval, start_ms, end_ms, require_closed=False):
+    """
+    Garante no cache os candles de `start_ms` a `end_ms`, buscando na API
+    apenas as faixas que faltam, em páginas de até PAGE_LIMIT candles.
+    Com `require_closed`, candles gravados antes do fechamento também são
+    buscados de novo (para obter high/low/close definitivos) assim que o
+    período deles termina.
+    """
+    passo = INTERVAL_MS[interval]
+    agora = int(time.time() * 1000)
+    start_ms -= start_ms % passo
+    end_ms = min(end_ms, agora)
+    expected = list(range(start_ms, end_ms + 1, passo))
+    if not expected:
+        return
+
+    with storage.connect() as conn:
+        conn.execute(_SCHEMA)
+        stored = _stored(conn, symbol, interval, start_ms, end_ms)
+
+    for inicio, fim in _missing_ranges(expected, passo, stored, require_closed, agora):
+        while inicio <= fim:
+            klines = client.get_klines(
+                symbol=symbol, interval=interval, startTime=inicio, endTime=fim + passo - 1, limit=PAGE_LIMIT
+            )
+            if not klines:
+                break
+            with storage.connect() as conn:
+                conn.execute(_SCHEMA)
+                conn.executemany(
+                    """INSERT OR REPLACE INTO klines
+                       (symbol, interval, open_time, open, high, low, close, volume, close_time, closed)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    [
+                        (symbol, interval, int(k[0]), float(k[1]), float(k[2]), float(k[3]),
+                         float(k[4]), float(k[5]), int(k[6]), int(int(k[6]) < agora))
+                        for k in klines
+                    ],
+                )
+            inicio = int(klines[-1][0]) + passo
+
+
+def get_daily_candles(client, symbol, start_day, end_day, require_closed=False):
+    """
+    Retorna {data: (open, close)} dos candles diários (UTC) entre as datas,
+    completando o cache quando necessário.
+    """
+    start_ms, end_ms = _day_ms(start_day), _day_ms(end_day)
+    backfill(client, symbol, "1d", start_ms, end_ms, require_closed=require_closed)
+    with storage.connect() as conn:
+        conn.execute(_SCHEMA)
+        rows = conn.execute(
+            """SELECT open_time, open, close FROM klines
+               WHERE symbol = ? AND interval = '1d' AND open_time >= ? AND open_time <= ?
+               ORDER BY open_time""",
+            (symbol, start_ms, end_ms),
+        ).fetchall()
+    return {_ms_day(r[0]): (r[1], r[2]) for r in rows}
+
+
+def get_daily_opens(client, symbol, start_day, end_day):
+    """Preços de abertura (00:00 UTC) de cada dia do intervalo: {data: open}."""
+    return {d: v[0] for d, v in get_daily_candles(client, symbol, start_day, end_day).items()}
+
+
+def get_day_open(client, symbol, day=None):
+    """
+    Preço de abertura do dia (00:00 UTC). O open de um candle diário não muda
+    depois de criado, então cada dia gera no máximo uma consulta à API.
+    Se o candle do dia ainda não existe, usa o fechamento do dia anterior.
+    """
+    day = day or datetime.now(timezone.utc).date()
+    candles = get_daily_candles(client, symbol, day - timedelta(days=1), day)
+    if day in candles:
+        return candles[day][0]
+    if day - timedelta(days=1) in candles:
+        return candles[day - timedelta(days=1)][1]
+    return None
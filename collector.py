@@ -0,0 +1,46 @@
+import os
+import time
+
+from dotenv import load_dotenv
+
+import metrics
+import portfolio
+import snapshot_store
+from data_collector import montar_portfolio
+
+load_dotenv()
+
+# Intervalo entre coletas, em segundos
+COLLECTOR_INTERVAL = float(os.getenv("COLLECTOR_INTERVAL", "60"))
+
+
+def main():
+    """
+    Processo coletor: é o único dono do cliente da Binance. Atualiza trades,
+    preços e saldos periodicamente e publica o resultado no armazenamento
+    local lido pelo painel Streamlit.
+    """
+    contas = portfolio.carregar_portfolio()
+    metrics.iniciar_servidor()
+    if os.getenv("BINANCE_STREAMING", "0") == "1":
+        from stream_state import start_stream
+        for conta, cfg in contas.items():
+            with portfolio.usar_conta(conta):
+                start_stream(list(cfg["ativos"]))
+
+    print(f"📡 Coletor iniciado para {', '.join(contas)} (a cada {COLLECTOR_INTERVAL:.0f}s)")
+    while True:
+        inicio = time.time()
+        try:
+            with metrics.medir("ciclo_coletor"):
+                painel = montar_portfolio(contas)
+            snapshot_store.publish(painel)
+            for origem, e in painel["erros"]:
+                print(f"[Erro] coleta {origem}: {e}")
+        except Exception as e:
+            print(f"[Erro] ciclo de coleta: {e}")
+        time.sleep(max(0.0, COLLECTOR_INTERVAL - (time.time() - inicio)))
+
+
+if __name__ == "__main__":
+    main()
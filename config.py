@@ -0,0 +1,4 @@
+# Pares acompanhados pelo painel e pelo coletor: {symbol: estratégia}
+ATIVOS = {
+    "XRPUSDT": "QuickScalp",
+}
@@ -0,0 +1,199 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+import candle_store
+import portfolio
+import position_checkpoint
+import storage
+import trade_store
+import transfer_ledger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    day TEXT NOT NULL,
+    asset TEXT NOT NULL,
+    realized_pnl REAL NOT NULL,
+    qty_eod REAL NOT NULL,
+    close REAL,
+    value_eod REAL,
+    net_transfers REAL NOT NULL,
+    binance_pnl REAL,
+    final INTEGER NOT NULL,
+    PRIMARY KEY (day, asset)
+)
+"""
+
+_COLUMNS = ["day", "asset", "realized_pnl", "qty_eod", "close", "value_eod", "net_transfers", "binance_pnl"]
+
+
+def _today():
+    return datetime.now(timezone.utc).date()
+
+
+def _day_ms(day):
+    return int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _pending_days(conn, assets, start_day, end_day, force):
+    """Dias do intervalo que ainda não têm rollup definitivo para todos os ativos."""
+    dias = [start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1)]
+    if force:
+        return dias
+    marcadores = ",".join("?" * len(assets))
+    rows = conn.execute(
+        f"""SELECT day, COUNT(*) FROM daily_rollups
+            WHERE final = 1 AND day >= ? AND day <= ? AND asset IN ({marcadores}) GROUP BY day""",
+        [start_day.isoformat(), end_day.isoformat(), *assets],
+    ).fetchall()
+    prontos = {r[0] for r in rows if r[1] == len(assets)}
+    return [d for d in dias if d.isoformat() not in prontos]
+
+
+def _quantidade_fim_do_dia(atual, fluxo):
+    """Saldo ao fim de cada dia: saldo atual menos tudo o que entrou nos dias seguintes."""
+    posterior = fluxo[::-1].cumsum()[::-1] - fluxo
+    return atual - posterior
+
+
+def rebuild(client, ativos, balances, prices, start_day, end_day=None, force=False):
+    """
+    Reconstrói os rollups diários (UTC) de `start_day` até `end_day` a partir
+    dos trades, candles e transferências armazenados localmente.
+
+    Para cada ativo e dia grava: PnL realizado, quantidade e valor ao fim do
+    dia (reconstruídos para trás a partir do saldo atual), transferências
+    líquidas e o PnL do dia no modo Binance
+    (valor final - valor inicial - compras líquidas - transferências).
+    O saldo de USDT é reconstruído apenas com os trades dos pares acompanhados.
+
+    Dias já fechados com dados completos, e os anteriores à listagem do par,
+    ficam marcados como definitivos e não são recalculados, a menos que
+    `force` seja verdadeiro. Retorna a quantidade de dias recalculados.
+    """
+    hoje = _today()
+    end_day = min(end_day or hoje, hoje)
+    tokens = {symbol: symbol.replace("USDT", "") for symbol in ativos}
+    assets = list(tokens.values()) + ["USDT"]
+
+    with storage.connect() as conn:
+        conn.execute(_SCHEMA)
+        pendentes = _pending_days(conn, assets, start_day, end_day, force)
+    if not pendentes:
+        return 0
+
+    primeiro = min(pendentes)
+    inicio_ms = _day_ms(primeiro)
+    dias = [primeiro + timedelta(days=i) for i in range((hoje - primeiro).days + 1)]
+    transferencias_ok = transfer_ledger.backfill(client, inicio_ms)
+
+    rows = []
+    fluxo_usdt = pd.Series(0.0, index=dias)
+    for symbol, strategy in ativos.items():
+        token = tokens[symbol]
+        fluxo_qty = pd.Series(0.0, index=dias)
+        fluxo_quote = pd.Series(0.0, index=dias)
+
+        trades = pd.DataFrame(trade_store.load_columns(symbol, since=inicio_ms))
+        if not trades.empty:
+            dia = pd.to_datetime(trades["time"], unit="ms").dt.date
+            sinal = np.where(trades["isBuyer"], 1.0, -1.0)
+            comissao = trades["commission"].fillna(0.0)
+            qty_liquida = trades["qty"] * sinal - np.where(trades["commissionAsset"] == token, comissao, 0.0)
+            quote_liquido = trades["quoteQty"] * sinal + np.where(trades["commissionAsset"] == "USDT", comissao, 0.0)
+            fluxo_qty = qty_liquida.groupby(dia).sum().reindex(dias, fill_value=0.0)
+            fluxo_quote = quote_liquido.groupby(dia).sum().reindex(dias, fill_value=0.0)
+
+        transf = pd.Series(transfer_ledger.net_transfers_by_day(token, inicio_ms), dtype="float64")
+        transf = transf.reindex(dias, fill_value=0.0)
+
+        qty_eod = _quantidade_fim_do_dia(sum(balances.get(token, (0.0, 0.0))), fluxo_qty + transf)
+        qty_inicio = qty_eod - fluxo_qty - transf
+
+        candles = candle_store.get_daily_candles(client, symbol, primeiro, hoje, require_closed=True)
+        # Dias anteriores ao primeiro candle: o par ainda não era negociado
+        listagem = min(candles) if candles else None
+        abertura = pd.Series({d: v[0] for d, v in candles.items()}, dtype="float64").reindex(dias)
+        fechamento = pd.Series({d: v[1] for d, v in candles.items()}, dtype="float64").reindex(dias)
+        fechamento[hoje] = prices[symbol]
+
+        valor = qty_eod * fechamento
+        pnl_binance = valor - qty_inicio * abertura - fluxo_quote - transf * fechamento
+
+        historico = position_checkpoint.load_history(symbol, strategy, desde=inicio_ms)
+        realizado = historico["PnL USDT"].groupby(historico["Data/Hora"].dt.date).sum()
+        realizado = realizado.reindex(dias, fill_value=0.0)
+
+        fluxo_usdt -= fluxo_quote
+        for d in pendentes:
+            rows.append((
+                d.isoformat(), token, float(realizado[d]), float(qty_eod[d]),
+                None if pd.isnull(fechamento[d]) else float(fechamento[d]),
+                None if pd.isnull(valor[d]) else float(valor[d]),
+                float(transf[d]),
+                None if pd.isnull(pnl_binance[d]) else float(pnl_binance[d]),
+                int(d < hoje and transferencias_ok and (
+                    not pd.isnull(pnl_binance[d]) or (listagem is not None and d < listagem)
+                )),
+            ))
+
+    transf_usdt = pd.Series(transfer_ledger.net_transfers_by_day("USDT", inicio_ms), dtype="float64")
+    transf_usdt = transf_usdt.reindex(dias, fill_value=0.0)
+    usdt_eod = _quantidade_fim_do_dia(sum(balances.get("USDT", (0.0, 0.0))), fluxo_usdt + transf_usdt)
+    for d in pendentes:
+        rows.append((
+            d.isoformat(), "USDT", 0.0, float(usdt_eod[d]), 1.0, float(usdt_eod[d]),
+            float(transf_usdt[d]), 0.0, int(d < hoje and transferencias_ok),
+        ))
+
+    with storage.connect() as conn:
+        conn.execute(_SCHEMA)
+        conn.executemany(
+            f"""INSERT OR REPLACE INTO daily_rollups ({", ".join(_COLUMNS)}, final)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            rows,
+        )
+    return len(pendentes)
+
+
+def load_rollups(start_day, end_day=None):
+    """Lê os rollups gravados entre as datas (por dia e ativo)."""
+    end_day = end_day or _today()
+    with storage.connect() as conn:
+        conn.execute(_SCHEMA)
+        rows = conn.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM daily_rollups WHERE day >= ? AND day <= ? ORDER BY day, asset",
+            (start_day.isoformat(), end_day.isoformat()),
+        ).fetchall()
+    df = pd.DataFrame(rows, columns=_COLUMNS)
+    df["day"] = pd.to_datetime(df["day"])
+    return df
+
+
+def resumo_diario(start_day, end_day=None):
+    """
+    Agrega os rollups por dia: saldo estimado ao fim do dia (ativos + USDT),
+    PnL realizado e PnL do dia no modo Binance.
+    """
+    df = load_rollups(start_day, end_day)
+    resumo = df.groupby("day").agg(
+        saldo=("value_eod", "sum"),
+        realizado=("realized_pnl", "sum"),
+        pnl_binance=("binance_pnl", "sum"),
+    )
+    resumo.index.name = "Data"
+    return resumo.rename(columns={
+        "saldo": "Saldo Estimado",
+        "realizado": "PnL Realizado",
+        "pnl_binance": "PnL do Dia (Binance)",
+    })
+
+
+def resumo_consolidado(contas, start_day, end_day=None):
+    """Soma por dia o `resumo_diario` de cada conta do portfólio."""
+    resumos = []
+    for conta in contas:
+        with portfolio.usar_conta(conta):
+            resumos.append(resumo_diario(start_day, end_day))
+    return pd.concat(resumos).groupby(level="Data").sum(min_count=1)
@@ -0,0 +1,253 @@
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import daily_rollup
+import metrics
+import order_book
+import portfolio
+import resilience
+import transfer_ledger
+from binance_client import client, fontes_desatualizadas, sync_trades, get_price, get_prices, get_balance, get_open_orders, get_real_balance, get_account_snapshot
+from pnl_calculator import calculate_daily_pnl
+from position_checkpoint import processar_trades_incremental
+
+# Número máximo de pares coletados em paralelo
+MAX_WORKERS = int(os.getenv("COLLECTOR_MAX_WORKERS", "8"))
+
+# Dias de histórico mantidos nos rollups diários
+ROLLUP_DAYS = int(os.getenv("ROLLUP_DAYS", "365"))
+
+
+def coletar_simbolo(symbol, estrategia, processar=processar_trades_incremental):
+    """
+    Coleta trades, preço e saldo de um par e processa o histórico.
+    Pode rodar em paralelo com os demais pares.
+
+    `processar(symbol, estrategia, preco_atual)` calcula (histórico, posição);
+    o painel o substitui por uma versão em cache.
+    """
+    with metrics.medir("sync_trades", symbol=symbol):
+        sync_trades(symbol)
+    preco_atual = get_price(symbol)
+
+    token = symbol.replace("USDT", "")
+    saldo = get_balance(token)
+    if saldo is None:
+        raise RuntimeError(f"saldo de {token} indisponível")
+    saldo_livre, _ = saldo
+
+    # Aplica apenas os trades novos sobre o checkpoint salvo do par
+    with metrics.medir("processar_historico", symbol=symbol):
+        df_story, df_posicao = processar(symbol, estrategia, preco_atual)
+
+    return {
+        "symbol": symbol,
+        "estrategia": estrategia,
+        "token": token,
+        "preco_atual": preco_atual,
+        "saldo_livre": float(saldo_livre),
+        "historico": df_story,
+        "posicao": df_posicao,
+    }
+
+
+def _coletar_com_erro(symbol, estrategia, processar):
+    try:
+        return coletar_simbolo(symbol, estrategia, processar), None
+    except Exception as e:
+        return None, e
+
+
+def coletar_dados(ativos, max_workers=MAX_WORKERS, processar=processar_trades_incremental):
+    """
+    Coleta todos os pares de `ativos` ({symbol: estratégia}) em paralelo.
+
+    Conta e preços são buscados uma única vez (ou lidos do stream, quando
+    ativo) antes da distribuição entre as threads; o peso das requisições é
+    controlado pelo balde de `rate_limiter`.
+    As threads herdam a conta selecionada com `portfolio.usar_conta`.
+    Retorna (resultados, erros): resultados na ordem de `ativos` e erros como
+    lista de (origem, exceção).
+    """
+    erros = []
+    try:
+        # Renova a conta a cada ciclo pelo REST, a menos que o stream de usuário já a mantenha
+        get_account_snapshot(max_age=0)
+    except Exception as e:
+        erros.append(("conta", e))
+    try:
+        get_prices(list(ativos))
+    except Exception as e:
+        erros.append(("preços", e))
+
+    resultados = []
+    workers = max(1, min(max_workers, len(ativos)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futuros = [(symbol, pool.submit(contextvars.copy_context().run, _coletar_com_erro, symbol, estrategia, processar)) for symbol, estrategia in ativos.items()]
+        for symbol, futuro in futuros:
+            resultado, erro = futuro.result()
+            if erro is not None:
+                erros.append((symbol, erro))
+            else:
+                resultados.append(resultado)
+
+    return resultados, erros
+
+
+def montar_painel(ativos, processar=processar_trades_incremental):
+    """
+    Executa um ciclo completo de coleta e devolve tudo o que o painel exibe:
+    resultados por par, erros, saldo em USDT, o detalhamento dos ativos com
+    o PnL do dia no modo Binance e o livro de ordens abertas da conta.
+    """
+    # Uma única consulta de ordens abertas da conta, feita antes de sincronizar os
+    # trades: uma ordem que sair do livro depois dela só é classificada no próximo
+    # ciclo, quando a execução já estiver armazenada
+    try:
+        with metrics.medir("livro_ordens"):
+            ordens_abertas = get_open_orders()
+    except Exception as e:
+        ordens_abertas = None
+        erros_ordens = [("ordens abertas", e)]
+    else:
+        erros_ordens = []
+
+    with metrics.medir("coleta_pares"):
+        resultados, erros = coletar_dados(ativos, processar=processar)
+    erros += erros_ordens
+
+    if ordens_abertas is not None:
+        # Pares cujos trades não foram sincronizados neste ciclo não têm saídas classificadas
+        desatualizados = fontes_desatualizadas()
+        sincronizados = {r["symbol"] for r in resultados if f"trades {r['symbol']}" not in desatualizados}
+        try:
+            with metrics.medir("livro_ordens"):
+                order_book.atualizar(ordens_abertas, acompanhados=sincronizados)
+        except Exception as e:
+            erros.append(("ordens abertas", e))
+
+    saldo_usdt = get_balance("USDT")
+    if saldo_usdt is None:
+        erros.append(("USDT", RuntimeError("saldo indisponível")))
+        usdt_saldo = 0.0
+    else:
+        usdt_saldo = float(saldo_usdt[0])
+
+    ativos_detalhados = []
+    for symbol in ativos:
+        token = symbol.replace("USDT", "")
+        try:
+            preco_atual = get_price(symbol)
+            saldo_token = get_real_balance(token)
+            if saldo_token is None:
+                # Sem saldo conhecido, o saldo de abertura do dia não pode ser gravado
+                raise RuntimeError("saldo indisponível")
+
+            # PnL diário segundo a regra da Binance
+            with metrics.medir("pnl_diario", symbol=symbol):
+                _, pnl_token_hoje = calculate_daily_pnl(token, saldo_token, preco_atual)
+        except Exception as e:
+            erros.append((token, e))
+            continue
+
+        ativos_detalhados.append({
+            "Conta": portfolio.conta_atual(),
+            "Ativo": token,
+            "Qtd": saldo_token,
+            "Preço Atual": preco_atual,
+            "Valor Atual (USDT)": saldo_token * preco_atual,
+            "PnL do Dia (USDT)": pnl_token_hoje
+        })
+
+    # Rollups diários: só o dia corrente (e dias ainda incompletos) são recalculados
+    try:
+        hoje = datetime.now(timezone.utc).date()
+        with metrics.medir("rollups_diarios"):
+            daily_rollup.rebuild(
+                client, ativos, get_account_snapshot(), get_prices(list(ativos)), hoje - timedelta(days=ROLLUP_DAYS)
+            )
+    except Exception as e:
+        erros.append(("rollups diários", e))
+
+    return {
+        "resultados": resultados,
+        "erros": [(origem, str(e)) for origem, e in erros],
+        "usdt_saldo": usdt_saldo,
+        "ativos_detalhados": ativos_detalhados,
+        "transferencias": transfer_ledger.get_sync_status(),
+        "ordens": order_book.ordens_abertas(),
+        "eventos_ordens": order_book.eventos(desde=_inicio_do_dia_ms()),
+        "desatualizados": fontes_desatualizadas(),
+        "coletado_em": time.time(),
+    }
+
+
+def _inicio_do_dia_ms():
+    hoje = datetime.now(timezone.utc).date()
+    return int(datetime(hoje.year, hoje.month, hoje.day, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _montar_painel_da_conta(conta, ativos, processar):
+    with portfolio.usar_conta(conta):
+        try:
+            with metrics.medir("painel_conta", conta=conta):
+                return montar_painel(ativos, processar)
+        except Exception as e:
+            return {
+                "resultados": [], "erros": [("conta", str(e))], "usdt_saldo": 0.0,
+                "ativos_detalhados": [], "transferencias": {"status": "falhou", "last_success": None, "error": str(e)},
+                "ordens": [], "eventos_ordens": [], "desatualizados": {}, "coletado_em": time.time(),
+            }
+
+
+# Ordem de gravidade dos estados do livro de transferências, do pior para o melhor
+_GRAVIDADE_TRANSFERENCIAS = ["falhou", "desatualizado", "sem dados", "ok"]
+
+
+def montar_portfolio(contas, processar=processar_trades_incremental):
+    """
+    Coleta todas as contas do portfólio ({conta: {"ativos": {...}, ...}}) em
+    paralelo, cada uma com seu cliente e banco local, e consolida o painel:
+    resultados e ativos marcados com a conta, erros prefixados por ela e
+    saldo em USDT somado.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, len(contas))) as pool:
+        futuros = {
+            conta: pool.submit(contextvars.copy_context().run, _montar_painel_da_conta, conta, cfg["ativos"], processar)
+            for conta, cfg in contas.items()
+        }
+        paineis = {conta: futuro.result() for conta, futuro in futuros.items()}
+
+    resultados, erros, ativos_detalhados, ordens, eventos_ordens = [], [], [], [], []
+    desatualizados = {}
+    for conta, painel in paineis.items():
+        for origem, _ in painel["erros"]:
+            metrics.incrementar("painel_erros_total", conta=conta, origem=origem)
+        resultados += [dict(r, conta=conta) for r in painel["resultados"]]
+        ordens += [dict(o, conta=conta) for o in painel["ordens"]]
+        eventos_ordens += [dict(e, conta=conta) for e in painel["eventos_ordens"]]
+        erros += [(origem if len(paineis) == 1 else f"{conta}/{origem}", e) for origem, e in painel["erros"]]
+        ativos_detalhados += painel["ativos_detalhados"]
+        for fonte, info in painel["desatualizados"].items():
+            desatualizados[fonte if len(paineis) == 1 else f"{conta}/{fonte}"] = info
+
+    transferencias = min(
+        (p["transferencias"] for p in paineis.values()),
+        key=lambda t: _GRAVIDADE_TRANSFERENCIAS.index(t["status"]) if t["status"] in _GRAVIDADE_TRANSFERENCIAS else 0,
+    )
+    return {
+        "resultados": resultados,
+        "erros": erros,
+        "usdt_saldo": sum(p["usdt_saldo"] for p in paineis.values()),
+        "ativos_detalhados": ativos_detalhados,
+        "transferencias": transferencias,
+        "ordens": ordens,
+        "eventos_ordens": sorted(eventos_ordens, key=lambda e: e["time"], reverse=True),
+        "desatualizados": desatualizados,
+        "metricas": metrics.snapshot(),
+        "disjuntores": resilience.breaker_states(),
+        "coletado_em": time.time(),
+    }
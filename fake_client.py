@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# Modo do cliente da Binance: live (padrão), record, replay ou synthetic
+CLIENT_MODE = os.getenv("BINANCE_CLIENT_MODE", "live")
+
+# Diretório das respostas gravadas (uma subpasta por conta)
+FIXTURES_DIR = os.getenv("BINANCE_FIXTURES_DIR", "fixtures")
+
+# Tamanho e semente do histórico gerado no modo synthetic
+SYNTHETIC_TRADES = int(os.getenv("SYNTHETIC_TRADES", "10000"))
+SYNTHETIC_SEED = int(os.getenv("SYNTHETIC_SEED", "42"))
+
+# Parâmetros que mudam a cada execução e não identificam a resposta gravada
+_VOLATILE_PARAMS = {"startTime", "endTime", "timestamp", "recvWindow"}
+
+_INTERVAL_MS = {"1m": 60_000, "5m": 300_000, "15m": 900_000, "1h": 3_600_000, "4h": 14_400_000, "1d": 86_400_000}
+
+
+def _chave(method, params, volateis=True):
+    itens = {k: v for k, v in params.items() if volateis or k not in _VOLATILE_PARAMS}
+    return hashlib.sha1(f"{method}:{json.dumps(itens, sort_keys=True, default=str)}".encode()).hexdigest()[:16]
+
+
+class RecordingClient:
+    """
+    Envolve o Client real e grava em disco cada resposta das chamadas get_*
+    (um JSON por método e parâmetros), para depois servi-las com ReplayClient.
+    """
+
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or not name.startswith("get_"):
+            return attr
+
+        def call(*args, **params):
+            resposta = attr(*args, **params)
+            # O timeout da requisição não faz parte da identidade da resposta
+            params = {k: v for k, v in params.items() if k != "requests_params"}
+            pasta = os.path.join(self.path, name)
+            with self._lock:
+                os.makedirs(pasta, exist_ok=True)
+                with open(os.path.join(pasta, f"{_chave(name, params)}.json"), "w") as f:
+                    json.dump({"params": params, "time": time.time(), "response": resposta}, f)
+            return resposta
+
+        return call
+
+
+class ReplayClient:
+    """
+    Serve as respostas gravadas por RecordingClient, sem rede nem credenciais.
+
+    A busca é exata pelos parâmetros; se não houver gravação, ignora os
+    parâmetros de tempo (startTime, endTime...) e usa a gravação mais recente
+    do método com os demais parâmetros iguais. Sem nenhuma, levanta KeyError.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._exatas = {}
+        self._aproximadas = {}
+        self._carregar()
+
+    def _carregar(self):
+        if not os.path.isdir(self.path):
+            return
+        for method in sorted(os.listdir(self.path)):
+            pasta = os.path.join(self.path, method)
+            for nome in os.listdir(pasta):
+                with open(os.path.join(pasta, nome), "r") as f:
+                    gravacao = json.load(f)
+                params, resposta = gravacao["params"], gravacao["response"]
+                self._exatas[_chave(method, params)] = resposta
+                chave = _chave(method, params, volateis=False)
+                anterior = self._aproximadas.get(chave)
+                if anterior is None or anterior[0] <= gravacao["time"]:
+                    self._aproximadas[chave] = (gravacao["time"], resposta)
+
+    def __getattr__(self, name):
+        if not name.startswith("get_"):
+            raise AttributeError(name)
+
+        def call(**params):
+            chave = _chave(name, params)
+            if chave in self._exatas:
+                return self._exatas[chave]
+            aproximada = self._aproximadas.get(_chave(name, params, volateis=False))
+            if aproximada is None:
+                raise KeyError(f"sem gravação para {name}({params}) em {self.path}")
+            return aproximada[1]
+
+        return call
+
+
+def gerar_trades(symbol, n, seed=SYNTHETIC_SEED, inicio_ms=None, preco_inicial=0.5):
+    """
+    Gera `n` fills sintéticos do par como arrays NumPy (id, time, price, qty,
+    quoteQty, isBuyer), com passeio aleatório de preço e sequências de compras
+    e vendas longas o bastante para alternar entre posições long e short.
+    """
+    rng = np.random.default_rng(seed)
+    inicio_ms = int(time.time() * 1000) - n * 30_000 if inicio_ms is None else int(inicio_ms)
+
+    tempo = inicio_ms + np.cumsum(rng.exponential(30_000, n)).astype("int64")
+    preco = np.round(preco_inicial * np.exp(np.cumsum(rng.normal(0, 0.001, n))), 4)
+    qty = np.round(rng.lognormal(2.0, 0.6, n), 1) + 0.1
+    # Regimes de compra/venda com duração aleatória produzem viradas long ↔ short
+    regime = np.cumsum(rng.random(n) < 0.02) % 2 == 0
+    is_buyer = np.where(rng.random(n) < 0.75, regime, ~regime)
+
+    return {
+        "symbol": symbol,
+        "id": np.arange(1, n + 1, dtype="int64"),
+        "time": tempo,
+        "price": preco,
+        "qty": qty,
+        "quoteQty": np.round(preco * qty, 8),
+        "isBuyer": is_buyer,
+    }
+
+
+def trades_para_api(arrays, inicio=0, fim=None):
+    """Converte o intervalo [inicio, fim) dos arrays sintéticos em dicts no formato de get_my_trades."""
+    fim = len(arrays["id"]) if fim is None else fim
+    return [
+        {
+            "symbol": arrays["symbol"],
+            "id": int(i),
+            "orderId": int(i),
+            "price": f"{p:.8f}",
+            "qty": f"{q:.8f}",
+            "quoteQty": f"{v:.8f}",
+            "commission": "0",
+            "commissionAsset": "USDT",
+            "time": int(t),
+            "isBuyer": bool(b),
+            "isMaker": False,
+        }
+        for i, t, p, q, v, b in zip(
+            arrays["id"][inicio:fim], arrays["time"][inicio:fim], arrays["price"][inicio:fim],
+            arrays["qty"][inicio:fim], arrays["quoteQty"][inicio:fim], arrays["isBuyer"][inicio:fim],
+        )
+    ]
+
+
+class SyntheticClient:
+    """
+    Cliente determinístico que gera sob demanda um histórico sintético por
+    par: trades paginados por fromId, saldos coerentes com os trades, tickers
+    e candles derivados do mesmo passeio de preço.
+    """
+
+    def __init__(self, symbols=(), n_trades=SYNTHETIC_TRADES, seed=SYNTHETIC_SEED, saldo_usdt=1000.0):
+        self.n_trades = n_trades
+        self.seed = seed
+        self.saldo_usdt = saldo_usdt
+        self._pares = {}
+        self._lock = threading.Lock()
+        self._agora = int(time.time() * 1000)
+        for symbol in symbols:
+            self._par(symbol)
+
+    def _par(self, symbol):
+        with self._lock:
+            if symbol not in self._pares:
+                semente = self.seed + int(hashlib.sha1(symbol.encode()).hexdigest()[:6], 16)
+                par = gerar_trades(symbol, self.n_trades, semente, inicio_ms=0)
+                # O último fill acontece pouco antes de "agora"
+                par["time"] += self._agora - 1000 - par["time"][-1]
+                self._pares[symbol] = par
+            return self._pares[symbol]
+
+    def _preco_em(self, symbol, ms):
+        par = self._par(symbol)
+        i = np.searchsorted(par["time"], ms, side="right") - 1
+        return float(par["price"][max(i, 0)])
+
+    def get_my_trades(self, symbol, fromId=None, limit=500, startTime=None, endTime=None, **params):
+        par = self._par(symbol)
+        if fromId is None and startTime is not None:
+            inicio = int(np.searchsorted(par["time"], int(startTime)))
+        else:
+            inicio = int(np.searchsorted(par["id"], int(fromId or 0)))
+        fim = min(inicio + int(limit), len(par["id"]))
+        if endTime is not None:
+            fim = min(fim, int(np.searchsorted(par["time"], int(endTime), side="right")))
+        return trades_para_api(par, inicio, max(inicio, fim))
+
+    def get_symbol_ticker(self, symbol=None, **params):
+        symbols = [symbol] if symbol else list(self._pares)
+        tickers = [{"symbol": s, "price": f"{self._preco_em(s, self._agora):.8f}"} for s in symbols]
+        return tickers[0] if symbol else tickers
+
+    def get_account(self, **params):
+        balances = [{"asset": "USDT", "free": f"{self.saldo_usdt:.8f}", "locked": "0"}]
+        for symbol, par in self._pares.items():
+            posicao = float(np.sum(np.where(par["isBuyer"], par["qty"], -par["qty"])))
+            balances.append({"asset": symbol.replace("USDT", ""), "free": f"{max(posicao, 0.0):.8f}", "locked": "0"})
+        return {"updateTime": int(self._agora), "balances": balances}
+
+    def get_klines(self, symbol, interval, startTime, endTime=None, limit=500, **params):
+        passo = _INTERVAL_MS[interval]
+        fim = min(int(endTime or self._agora), self._agora)
+        inicios = np.arange(int(startTime) - int(startTime) % passo, fim + 1, passo)[: int(limit)]
+        klines = []
+        for t in inicios:
+            abertura, fechamento = self._preco_em(symbol, t), self._preco_em(symbol, t + passo - 1)
+            klines.append([
+                int(t), f"{abertura}", f"{max(abertura, fechamento)}", f"{min(abertura, fechamento)}",
+                f"{fechamento}", "0", int(t + passo - 1), "0", 0, "0", "0", "0",
+            ])
+        return klines
+
+    def get_open_orders(self, **params):
+        return []
+
+    def get_deposit_history(self, **params):
+        return []
+
+    def get_withdraw_history(self, **params):
+        return []
+
+    def get_server_time(self):
+        return {"serverTime": int(time.time() * 1000)}
+
+
+def criar_cliente_offline(conta, symbols=(), modo=CLIENT_MODE):
+    """Cliente de replay ou sintético para a conta, ou None no modo live/record."""
+    if modo == "replay":
+        return ReplayClient(os.path.join(FIXTURES_DIR, conta))
+    if modo == "synthetic":
+        return SyntheticClient(symbols)
+    return None
+
+
+def gravar(client, conta, modo=CLIENT_MODE):
+    """No modo record, envolve o cliente real para gravar as respostas da conta."""
+    if modo == "record":
+        return RecordingClient(client, os.path.join(FIXTURES_DIR, conta))
+    return client
@@ -0,0 +1,188 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Porta do endpoint Prometheus (/metrics); vazio ou 0 desativa o servidor
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0") or 0)
+
+# Limites (segundos) dos buckets dos histogramas de latência
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_contadores = {}
+_medidores = {}
+_histogramas = {}
+
+_servidor = None
+
+
+def _chave(nome, rotulos):
+    return nome, tuple(sorted((k, str(v)) for k, v in rotulos.items()))
+
+
+def incrementar(nome, valor=1.0, **rotulos):
+    """Soma `valor` ao contador `nome` com os rótulos informados."""
+    chave = _chave(nome, rotulos)
+    with _lock:
+        _contadores[chave] = _contadores.get(chave, 0.0) + valor
+
+
+def definir(nome, valor, **rotulos):
+    """Define o valor atual do medidor `nome`."""
+    with _lock:
+        _medidores[_chave(nome, rotulos)] = float(valor)
+
+
+def observar(nome, segundos, **rotulos):
+    """Registra uma duração no histograma `nome`."""
+    chave = _chave(nome, rotulos)
+    with _lock:
+        h = _histogramas.get(chave)
+        if h is None:
+            h = _histogramas[chave] = {"buckets": [0] * len(LATENCY_BUCKETS), "count": 0, "sum": 0.0}
+        for i, limite in enumerate(LATENCY_BUCKETS):
+            if segundos <= limite:
+                h["buckets"][i] += 1
+        h["count"] += 1
+        h["sum"] += segundos
+
+
+@contextmanager
+def medir(etapa, **rotulos):
+    """
+    Mede a duração de uma etapa do painel (histograma painel_etapa_segundos)
+    e conta as falhas em painel_etapa_erros_total, repassando a exceção.
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        incrementar("painel_etapa_erros_total", etapa=etapa, **rotulos)
+        raise
+    finally:
+        observar("painel_etapa_segundos", time.perf_counter() - inicio, etapa=etapa, **rotulos)
+
+
+def snapshot():
+    """Cópia serializável de todas as métricas, para publicar junto com o painel."""
+    with _lock:
+        return {
+            "contadores": [(n, dict(r), v) for (n, r), v in _contadores.items()],
+            "medidores": [(n, dict(r), v) for (n, r), v in _medidores.items()],
+            "histogramas": [
+                (n, dict(r), {"buckets": list(h["buckets"]), "count": h["count"], "sum": h["sum"]})
+                for (n, r), h in _histogramas.items()
+            ],
+        }
+
+
+def _quantil(h, q):
+    """Quantil aproximado pelo limite superior do bucket que o contém."""
+    if not h["count"]:
+        return None
+    alvo = q * h["count"]
+    for limite, acumulado in zip(LATENCY_BUCKETS, h["buckets"]):
+        if acumulado >= alvo:
+            return limite
+    return float("inf")
+
+
+def resumo(dados=None):
+    """
+    Linhas para o painel de diagnóstico: por histograma, chamadas, média,
+    p50/p95 aproximados e erros/tentativas extras com os mesmos rótulos.
+    """
+    dados = dados or snapshot()
+    contadores = {(n, tuple(sorted(r.items()))): v for n, r, v in dados["contadores"]}
+    linhas = []
+    for nome, rotulos, h in dados["histogramas"]:
+        r = tuple(sorted(rotulos.items()))
+        erros_nome = "binance_erros_total" if nome.startswith("binance_") else "painel_etapa_erros_total"
+        linhas.append({
+            "Métrica": nome,
+            "Rótulos": ", ".join(f"{k}={v}" for k, v in r),
+            "Chamadas": h["count"],
+            "Média (ms)": h["sum"] / h["count"] * 1000 if h["count"] else 0.0,
+            "p50 (ms)": (_quantil(h, 0.5) or 0.0) * 1000,
+            "p95 (ms)": (_quantil(h, 0.95) or 0.0) * 1000,
+            "Total (s)": h["sum"],
+            "Erros": contadores.get((erros_nome, r), 0.0),
+            "Tentativas extras": contadores.get(("binance_tentativas_extras_total", r), 0.0),
+            "Peso": contadores.get(("binance_peso_total", r), 0.0),
+        })
+    return sorted(linhas, key=lambda l: l["Total (s)"], reverse=True)
+
+
+def _rotulos_texto(rotulos, extra=None):
+    itens = sorted(rotulos.items()) + ([extra] if extra else [])
+    if not itens:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in itens) + "}"
+
+
+def exportar_prometheus(dados=None):
+    """Métricas no formato de texto do Prometheus (versão 0.0.4)."""
+    dados = dados or snapshot()
+    linhas = []
+    tipos = set()
+
+    def tipo(nome, t):
+        if nome not in tipos:
+            tipos.add(nome)
+            linhas.append(f"# TYPE {nome} {t}")
+
+    for nome, rotulos, valor in sorted(dados["contadores"], key=lambda x: x[0]):
+        tipo(nome, "counter")
+        linhas.append(f"{nome}{_rotulos_texto(rotulos)} {valor}")
+    for nome, rotulos, valor in sorted(dados["medidores"], key=lambda x: x[0]):
+        tipo(nome, "gauge")
+        linhas.append(f"{nome}{_rotulos_texto(rotulos)} {valor}")
+    for nome, rotulos, h in sorted(dados["histogramas"], key=lambda x: x[0]):
+        tipo(nome, "histogram")
+        for limite, acumulado in zip(LATENCY_BUCKETS, h["buckets"]):
+            linhas.append(f"{nome}_bucket{_rotulos_texto(rotulos, ('le', limite))} {acumulado}")
+        linhas.append(f"{nome}_bucket{_rotulos_texto(rotulos, ('le', '+Inf'))} {h['count']}")
+        linhas.append(f"{nome}_sum{_rotulos_texto(rotulos)} {h['sum']}")
+        linhas.append(f"{nome}_count{_rotulos_texto(rotulos)} {h['count']}")
+    return "\n".join(linhas) + "\n"
+
+
+def _metrics_handler():
+    # http.server só é importado quando o endpoint é ligado
+    from http.server import BaseHTTPRequestHandler
+
+    class _MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            corpo = exportar_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, format, *args):
+            pass
+
+    return _MetricsHandler
+
+
+def iniciar_servidor(porta=METRICS_PORT):
+    """Sobe (uma única vez por processo) o endpoint /metrics em uma thread daemon."""
+    global _servidor
+    if not porta:
+        return None
+    from http.server import ThreadingHTTPServer
+
+    with _lock:
+        if _servidor is None:
+            try:
+                _servidor = ThreadingHTTPServer(("0.0.0.0", porta), _metrics_handler())
+            except OSError as e:
+                print(f"[Erro] endpoint de métricas na porta {porta}:", e)
+                return None
+            threading.Thread(target=_servidor.serve_forever, daemon=True).start()
+    return _servidor
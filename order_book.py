@@ -0,0 +1,164 @@
+import time
+
+import storage
+import trade_store
+
+# Quantidade de eventos de ciclo de vida devolvidos por padrão ao painel
+EVENT_LIMIT = 200
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS open_orders (
+        order_id INTEGER NOT NULL,
+        symbol TEXT NOT NULL,
+        side TEXT NOT NULL,
+        type TEXT,
+        price REAL NOT NULL,
+        orig_qty REAL NOT NULL,
+        executed_qty REAL NOT NULL,
+        status TEXT NOT NULL,
+        created INTEGER NOT NULL,
+        updated INTEGER NOT NULL,
+        PRIMARY KEY (symbol, order_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS order_events (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id INTEGER NOT NULL,
+        symbol TEXT NOT NULL,
+        side TEXT NOT NULL,
+        event TEXT NOT NULL,
+        price REAL NOT NULL,
+        orig_qty REAL NOT NULL,
+        executed_qty REAL NOT NULL,
+        time INTEGER NOT NULL,
+        time_in_book INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_order_events_time ON order_events (time)",
+]
+
+_COLUMNS = "order_id, symbol, side, type, price, orig_qty, executed_qty, status, created, updated"
+
+
+def _ensure_schema(conn):
+    for ddl in _SCHEMA:
+        conn.execute(ddl)
+
+
+def _to_row(o):
+    return (
+        int(o["orderId"]),
+        o["symbol"],
+        o["side"],
+        o.get("type"),
+        float(o["price"]),
+        float(o["origQty"]),
+        float(o.get("executedQty", 0)),
+        o["status"],
+        int(o["time"]),
+        int(o.get("updateTime", o["time"])),
+    )
+
+
+def atualizar(ordens, agora=None, acompanhados=None):
+    """
+    Compara a lista de ordens abertas da conta (uma chamada get_open_orders
+    sem par) com o livro salvo e registra os eventos de ciclo de vida:
+    "nova", "parcial" (executedQty mudou), "executada", "cancelada" e
+    "desconhecido".
+
+    Ordens sem mudança de updateTime não são convertidas de novo. Uma ordem
+    que saiu do livro é considerada executada quando os trades armazenados
+    cobrem toda a quantidade; caso contrário, cancelada (ou expirada).
+    Só os pares em `acompanhados` (todos, se None) têm trades sincronizados:
+    nos demais, a saída sem execução completa conhecida fica "desconhecido".
+    Os trades dos pares devem ser sincronizados antes desta chamada.
+    Retorna a contagem de eventos por tipo.
+    """
+    agora = int(agora if agora is not None else time.time() * 1000)
+    contagem = {"nova": 0, "parcial": 0, "executada": 0, "cancelada": 0, "desconhecido": 0}
+
+    with storage.connect() as conn:
+        _ensure_schema(conn)
+        livro = {(r[1], r[0]): r for r in conn.execute(f"SELECT {_COLUMNS} FROM open_orders").fetchall()}
+
+    atuais = {(o["symbol"], int(o["orderId"])): o for o in ordens}
+    saidas = [r for chave, r in livro.items() if chave not in atuais]
+    executado = trade_store.executed_qty([(r[1], r[0]) for r in saidas])
+
+    gravar = []
+    eventos = []
+    for chave, o in atuais.items():
+        anterior = livro.get(chave)
+        if anterior is not None and anterior[9] == int(o.get("updateTime", o["time"])):
+            continue
+        row = _to_row(o)
+        gravar.append(row)
+        if anterior is None:
+            eventos.append((row[0], row[1], row[2], "nova", row[4], row[5], row[6], row[9], row[9] - row[8]))
+        elif row[6] != anterior[6]:
+            eventos.append((row[0], row[1], row[2], "parcial", row[4], row[5], row[6], row[9], row[9] - row[8]))
+
+    for r in saidas:
+        qtd_executada = max(r[6], executado.get((r[1], r[0]), 0.0))
+        if qtd_executada >= r[5] - 1e-12:
+            evento = "executada"
+        elif acompanhados is None or r[1] in acompanhados:
+            evento = "cancelada"
+        else:
+            evento = "desconhecido"
+        eventos.append((r[0], r[1], r[2], evento, r[4], r[5], qtd_executada, agora, agora - r[8]))
+
+    with storage.connect() as conn:
+        _ensure_schema(conn)
+        conn.executemany(f"INSERT OR REPLACE INTO open_orders ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", gravar)
+        conn.executemany("DELETE FROM open_orders WHERE symbol = ? AND order_id = ?", [(r[1], r[0]) for r in saidas])
+        conn.executemany(
+            """INSERT INTO order_events
+               (order_id, symbol, side, event, price, orig_qty, executed_qty, time, time_in_book)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            eventos,
+        )
+
+    for e in eventos:
+        contagem[e[3]] += 1
+    return contagem
+
+
+def ordens_abertas():
+    """Ordens no livro, no formato de get_open_orders (valores já numéricos)."""
+    with storage.connect() as conn:
+        _ensure_schema(conn)
+        rows = conn.execute(f"SELECT {_COLUMNS} FROM open_orders ORDER BY created").fetchall()
+    return [
+        {
+            "orderId": r[0], "symbol": r[1], "side": r[2], "type": r[3], "price": r[4],
+            "origQty": r[5], "executedQty": r[6], "status": r[7], "time": r[8], "updateTime": r[9],
+        }
+        for r in rows
+    ]
+
+
+def eventos(desde=None, limite=EVENT_LIMIT):
+    """Eventos de ciclo de vida mais recentes (a partir de `desde`, em ms), do mais novo ao mais antigo."""
+    query = """SELECT order_id, symbol, side, event, price, orig_qty, executed_qty, time, time_in_book
+               FROM order_events"""
+    params = []
+    if desde is not None:
+        query += " WHERE time >= ?"
+        params.append(int(desde))
+    query += " ORDER BY seq DESC LIMIT ?"
+    params.append(int(limite))
+
+    with storage.connect() as conn:
+        _ensure_schema(conn)
+        rows = conn.execute(query, params).fetchall()
+    return [
+        {
+            "orderId": r[0], "symbol": r[1], "side": r[2], "event": r[3], "price": r[4],
+            "origQty": r[5], "executedQty": r[6], "time": r[7], "timeInBook": r[8],
+        }
+        for r in rows
+    ]
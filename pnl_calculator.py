@@ -1,25 +1,59 @@
 import json
 import os
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
+import storage
+import transfer_ledger
 from binance_client import client
 
-# Arquivo onde o histórico diário de saldos é armazenado
+# Arquivo JSON legado com o histórico diário de saldos (importado uma única vez)
 HISTORY_FILE = "daily_balances.json"
 
+# Dias de saldos iniciais mantidos no diário; registros mais antigos são descartados
+BALANCE_RETENTION_DAYS = int(os.getenv("BALANCE_RETENTION_DAYS", "400"))
 
-def _load_history():
-    """Carrega o histórico de saldos salvos no arquivo JSON."""
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, "r") as f:
-            return json.load(f)
-    return {}
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS opening_balances (
+    day TEXT NOT NULL,
+    asset TEXT NOT NULL,
+    balance REAL NOT NULL,
+    recorded_at REAL NOT NULL,
+    PRIMARY KEY (day, asset)
+)
+"""
 
+# Bancos que já receberam o histórico legado nesta execução (só o da conta padrão)
+_legado_importado = set()
 
-def _save_history(history):
-    """Salva o histórico de saldos no arquivo JSON."""
-    with open(HISTORY_FILE, "w") as f:
-        json.dump(history, f, indent=2)
+
+def _import_legacy_history(conn):
+    """Importa o daily_balances.json legado para o diário, sem sobrescrever registros."""
+    if not os.path.exists(HISTORY_FILE):
+        return
+    with open(HISTORY_FILE, "r") as f:
+        history = json.load(f)
+    conn.executemany(
+        "INSERT OR IGNORE INTO opening_balances (day, asset, balance, recorded_at) VALUES (?, ?, ?, 0)",
+        [(day, asset, float(balance)) for day, assets in history.items() for asset, balance in assets.items()],
+    )
+
+
+def _ensure_journal(conn):
+    """
+    Cria o diário no banco da conta atual. O histórico legado é da conta
+    original e só é importado (uma vez) no banco da conta padrão.
+    """
+    conn.execute(_SCHEMA)
+    banco = storage.db_file()
+    if banco == storage.DB_FILE and banco not in _legado_importado:
+        _import_legacy_history(conn)
+        _legado_importado.add(banco)
+
+
+def _compact_journal(conn, today):
+    """Remove os dias que saíram da janela de retenção."""
+    limite = (datetime.strptime(today, "%Y-%m-%d") - timedelta(days=BALANCE_RETENTION_DAYS)).strftime("%Y-%m-%d")
+    conn.execute("DELETE FROM opening_balances WHERE day < ?", (limite,))
 
 
 def _today_str():
@@ -31,53 +65,58 @@ def get_initial_balance(asset: str, current_balance: float) -> float:
     """
     Busca o saldo inicial do ativo no início do dia.
     Caso não exista registro para hoje, o saldo atual é usado como inicial
-    e gravado no histórico.
+    e gravado no diário. A gravação é atômica: com várias sessões ou o
+    coletor rodando ao mesmo tempo, prevalece o primeiro registro do dia.
+    Um saldo desconhecido (None) nunca é gravado como saldo de abertura.
     """
-    history = _load_history()
+    if current_balance is None:
+        raise ValueError(f"saldo atual de {asset} indisponível")
     today = _today_str()
 
-    if today not in history:
-        history[today] = {}
+    with storage.connect() as conn:
+        _ensure_journal(conn)
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO opening_balances (day, asset, balance, recorded_at) VALUES (?, ?, ?, ?)",
+            (today, asset, float(current_balance), datetime.now(timezone.utc).timestamp()),
+        )
+        if cur.rowcount:
+            _compact_journal(conn, today)
+        row = conn.execute(
+            "SELECT balance FROM opening_balances WHERE day = ? AND asset = ?", (today, asset)
+        ).fetchone()
 
-    if asset not in history[today]:
-        history[today][asset] = current_balance
-        _save_history(history)
+    return row[0]
 
-    return history[today][asset]
+
+def get_recorded_initial_balance(asset: str):
+    """Saldo inicial do ativo já registrado no diário para hoje, ou None; nunca grava."""
+    with storage.connect() as conn:
+        _ensure_journal(conn)
+        row = conn.execute(
+            "SELECT balance FROM opening_balances WHERE day = ? AND asset = ?", (_today_str(), asset)
+        ).fetchone()
+    return None if row is None else row[0]
 
 
 def get_net_transfers(asset: str) -> float:
     """
     Calcula o valor líquido de transferências e depósitos do dia para o ativo.
     Apenas movimentações ocorridas hoje (UTC) são consideradas:
-    
+
     Net = depósitos - saques
+
+    Os valores vêm do livro local de transferências, sincronizado de forma
+    incremental para todos os ativos; a situação da sincronização fica
+    disponível em `transfer_ledger.get_sync_status`.
     """
     start_of_day = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
     start_ts = int(start_of_day.timestamp() * 1000)
-    end_ts = int(datetime.now(timezone.utc).timestamp() * 1000)
-
-    deposit_qty = 0.0
-    withdraw_qty = 0.0
 
-    try:
-        deposits = client.get_deposit_history(coin=asset, startTime=start_ts, endTime=end_ts) or []
-        deposit_qty = sum(float(d["amount"]) for d in deposits if str(d.get("status")) == "1")
-    except Exception:
-        # Em caso de erro na API, consideramos nenhum depósito
-        deposit_qty = 0.0
+    transfer_ledger.sync(client)
+    return transfer_ledger.net_transfers(asset, start_ts)
 
-    try:
-        withdrawals = client.get_withdraw_history(coin=asset, startTime=start_ts, endTime=end_ts) or []
-        withdraw_qty = sum(float(w["amount"]) for w in withdrawals if str(w.get("status")) == "6")
-    except Exception:
-        # Em caso de erro na API, consideramos nenhum saque
-        withdraw_qty = 0.0
 
-    return deposit_qty - withdraw_qty
-
-
-def calculate_daily_pnl(asset: str, current_balance: float, current_price: float) -> tuple:
+def calculate_daily_pnl(asset: str, current_balance: float, current_price: float, registrar: bool = True) -> tuple:
     """
     Calcula o PnL diário conforme a regra padrão da Binance:
 
@@ -85,8 +124,16 @@ def calculate_daily_pnl(asset: str, current_balance: float, current_price: float
 
     *Total* representa o saldo do token. O valor em USDT é calculado multiplicando
     o resultado pelo preço atual.
+
+    Com `registrar` falso, apenas consulta o diário: sem saldo inicial
+    registrado para hoje, retorna None em vez de gravar o saldo atual.
     """
-    initial_balance = get_initial_balance(asset, current_balance)
+    if registrar:
+        initial_balance = get_initial_balance(asset, current_balance)
+    else:
+        initial_balance = get_recorded_initial_balance(asset)
+        if initial_balance is None:
+            return None
     net_transfers = get_net_transfers(asset)
 
     pnl_qty = current_balance - initial_balance - net_transfers
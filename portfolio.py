@@ -0,0 +1,69 @@
+import contextvars
+import json
+import os
+from contextlib import contextmanager
+
+from config import ATIVOS
+
+# Arquivo com as contas e estratégias acompanhadas; sem ele vale a conta única do .env
+PORTFOLIO_FILE = os.getenv("PORTFOLIO_FILE", "portfolio.json")
+
+# Conta usada quando não há portfólio configurado (credenciais BINANCE_API_KEY/SECRET)
+CONTA_PADRAO = "principal"
+
+_conta_atual = contextvars.ContextVar("conta_atual", default=CONTA_PADRAO)
+
+
+def carregar_portfolio(path=PORTFOLIO_FILE):
+    """
+    Lê o portfólio: {conta: {"api_key_env", "api_secret_env", "ativos": {symbol: estratégia}}}.
+
+    O arquivo guarda apenas os nomes das variáveis de ambiente com as
+    credenciais de cada conta, nunca as chaves em si. Sem arquivo, o
+    portfólio é a conta padrão com os ATIVOS de config.py.
+    """
+    if not os.path.exists(path):
+        return {
+            CONTA_PADRAO: {
+                "api_key_env": "BINANCE_API_KEY",
+                "api_secret_env": "BINANCE_API_SECRET",
+                "ativos": dict(ATIVOS),
+            }
+        }
+
+    with open(path, "r") as f:
+        dados = json.load(f)
+
+    portfolio = {}
+    for conta, cfg in dados.items():
+        portfolio[conta] = {
+            "api_key_env": cfg.get("api_key_env", "BINANCE_API_KEY"),
+            "api_secret_env": cfg.get("api_secret_env", "BINANCE_API_SECRET"),
+            "ativos": dict(cfg.get("ativos", {})),
+        }
+    return portfolio
+
+
+def credenciais(conta, portfolio=None):
+    """Retorna (api_key, api_secret) da conta a partir das variáveis de ambiente."""
+    cfg = (portfolio or carregar_portfolio())[conta]
+    return os.getenv(cfg["api_key_env"]), os.getenv(cfg["api_secret_env"])
+
+
+def conta_atual():
+    """Conta em uso no contexto atual (thread ou tarefa)."""
+    return _conta_atual.get()
+
+
+@contextmanager
+def usar_conta(conta):
+    """
+    Seleciona a conta do bloco: cliente da Binance, caches de saldo e banco
+    local passam a ser os dessa conta. Threads criadas dentro do bloco só
+    herdam a seleção se rodarem em uma cópia do contexto (contextvars).
+    """
+    token = _conta_atual.set(conta)
+    try:
+        yield conta
+    finally:
+        _conta_atual.reset(token)
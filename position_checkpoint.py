@@ -0,0 +1,269 @@
+import threading
+
+import pandas as pd
+
+import storage
+import trade_store
+from storytelling_calculator import calcular_historico, calcular_posicao_atual, tipar_historico
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS position_checkpoints (
+        symbol TEXT NOT NULL,
+        strategy TEXT NOT NULL,
+        last_trade_id INTEGER NOT NULL,
+        last_time INTEGER NOT NULL,
+        fingerprint TEXT NOT NULL,
+        posicao REAL NOT NULL,
+        preco_medio REAL NOT NULL,
+        resultado_realizado REAL NOT NULL,
+        PRIMARY KEY (symbol, strategy)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS position_history (
+        symbol TEXT NOT NULL,
+        strategy TEXT NOT NULL,
+        trade_id INTEGER NOT NULL,
+        time INTEGER NOT NULL,
+        is_buyer INTEGER NOT NULL,
+        qty REAL NOT NULL,
+        price REAL NOT NULL,
+        quote_qty REAL NOT NULL,
+        pnl REAL,
+        pnl_pct REAL,
+        posicao REAL NOT NULL,
+        preco_medio REAL NOT NULL,
+        PRIMARY KEY (symbol, strategy, trade_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_position_history_time ON position_history (symbol, strategy, time)",
+]
+
+
+# Histórico já lido por (banco, par, estratégia): (último trade_id, fingerprint, DataFrame)
+_historicos = {}
+_historicos_lock = threading.Lock()
+
+
+def _ensure_schema(conn):
+    for ddl in _SCHEMA:
+        conn.execute(ddl)
+
+
+def load_checkpoint(symbol, strategy):
+    """Retorna o checkpoint salvo do par/estratégia, ou None."""
+    with storage.connect() as conn:
+        _ensure_schema(conn)
+        row = conn.execute(
+            """SELECT last_trade_id, last_time, fingerprint, posicao, preco_medio, resultado_realizado
+               FROM position_checkpoints WHERE symbol = ? AND strategy = ?""",
+            (symbol, strategy),
+        ).fetchone()
+    if row is None:
+        return None
+    return {
+        "last_trade_id": row[0],
+        "last_time": row[1],
+        "fingerprint": row[2],
+        "posicao": row[3],
+        "preco_medio": row[4],
+        "resultado_realizado": row[5],
+    }
+
+
+def invalidate(symbol, strategy):
+    """Descarta o checkpoint e o histórico calculado do par/estratégia."""
+    with _historicos_lock:
+        _historicos.pop((storage.db_file(), symbol, strategy), None)
+    with storage.connect() as conn:
+        _ensure_schema(conn)
+        conn.execute("DELETE FROM position_checkpoints WHERE symbol = ? AND strategy = ?", (symbol, strategy))
+        conn.execute("DELETE FROM position_history WHERE symbol = ? AND strategy = ?", (symbol, strategy))
+
+
+def _save(symbol, strategy, df_trades, historico, checkpoint):
+    rows = zip(
+        df_trades["id"], df_trades["time"], df_trades["isBuyer"],
+        historico["Qtd"], historico["Preço"], historico["Total"],
+        historico["PnL USDT"], historico["PnL %"], historico["Posição"], historico["Preço Médio"],
+    )
+    with storage.connect() as conn:
+        _ensure_schema(conn)
+        conn.executemany(
+            """INSERT OR REPLACE INTO position_history
+               (symbol, strategy, trade_id, time, is_buyer, qty, price, quote_qty, pnl, pnl_pct, posicao, preco_medio)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            [
+                (symbol, strategy, int(i), int(t), int(b), q, p, qq,
+                 None if pd.isnull(v) else v, None if pd.isnull(vp) else vp, pos, pm)
+                for i, t, b, q, p, qq, v, vp, pos, pm in rows
+            ],
+        )
+        conn.execute(
+            """INSERT OR REPLACE INTO position_checkpoints
+               (symbol, strategy, last_trade_id, last_time, fingerprint, posicao, preco_medio, resultado_realizado)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (symbol, strategy, checkpoint["last_trade_id"], checkpoint["last_time"], checkpoint["fingerprint"],
+             checkpoint["posicao"], checkpoint["preco_medio"], checkpoint["resultado_realizado"]),
+        )
+
+
+def load_history(symbol, strategy, desde=None, apos_id=None):
+    """
+    Lê o histórico já calculado do par/estratégia no mesmo formato de
+    `calcular_historico`. `desde` (ms) limita às linhas a partir desse horário
+    e `apos_id`, às de trades posteriores a esse id.
+    """
+    query = """SELECT time, is_buyer, qty, price, quote_qty, pnl, pnl_pct, posicao, preco_medio
+               FROM position_history WHERE symbol = ? AND strategy = ?"""
+    params = [symbol, strategy]
+    if desde is not None:
+        query += " AND time >= ?"
+        params.append(int(desde))
+    if apos_id is not None:
+        query += " AND trade_id > ?"
+        params.append(int(apos_id))
+    query += " ORDER BY time, trade_id"
+
+    with storage.connect() as conn:
+        _ensure_schema(conn)
+        rows = conn.execute(query, params).fetchall()
+
+    df = pd.DataFrame(rows, columns=[
+        "time", "is_buyer", "qty", "price", "quote_qty", "pnl", "pnl_pct", "posicao", "preco_medio",
+    ])
+    return tipar_historico(pd.DataFrame({
+        "Estratégia": strategy,
+        "symbol": symbol,
+        "Tipo": df["is_buyer"].map({1: "Compra", 0: "Venda"}),
+        "Qtd": df["qty"],
+        "Preço": df["price"],
+        "Total": df["quote_qty"],
+        "PnL USDT": df["pnl"],
+        "PnL %": df["pnl_pct"],
+        "Posição": df["posicao"],
+        "Preço Médio": df["preco_medio"],
+        "time": df["time"],
+        "Data/Hora": pd.to_datetime(df["time"].astype("int64"), unit="ms"),
+    }))
+
+
+def atualizar_checkpoint(symbol, strategy):
+    """
+    Aplica ao checkpoint do par/estratégia apenas os trades posteriores a ele.
+
+    Se o histórico armazenado mudou desde o último checkpoint (trades
+    removidos, reescritos ou fora de ordem), o checkpoint é descartado e o
+    cálculo é refeito a partir do primeiro trade.
+    Retorna o checkpoint atualizado.
+    """
+    return _atualizar_checkpoint(symbol, strategy)[0]
+
+
+def _atualizar_checkpoint(symbol, strategy):
+    """
+    Como `atualizar_checkpoint`, mas devolve também (last_trade_id,
+    fingerprint) do checkpoint anterior quando ele foi conferido e mantido
+    (None se não havia checkpoint ou ele foi refeito).
+    """
+    checkpoint = load_checkpoint(symbol, strategy)
+    if checkpoint is not None and trade_store.fingerprint(symbol, checkpoint["last_trade_id"]) != checkpoint["fingerprint"]:
+        invalidate(symbol, strategy)
+        checkpoint = None
+    conferido = None if checkpoint is None else (checkpoint["last_trade_id"], checkpoint["fingerprint"])
+
+    from_id = None if checkpoint is None else checkpoint["last_trade_id"] + 1
+    novos = pd.DataFrame(trade_store.load_columns(symbol, from_id=from_id))
+
+    if novos.empty:
+        return checkpoint, conferido
+
+    if checkpoint is not None and novos["time"].min() < checkpoint["last_time"]:
+        invalidate(symbol, strategy)
+        return _atualizar_checkpoint(symbol, strategy)
+
+    novos = novos.sort_values(["time", "id"], kind="stable")
+    posicao_inicial = 0.0 if checkpoint is None else checkpoint["posicao"]
+    preco_medio_inicial = 0.0 if checkpoint is None else checkpoint["preco_medio"]
+    realizado_inicial = 0.0 if checkpoint is None else checkpoint["resultado_realizado"]
+
+    historico = calcular_historico(novos, strategy, posicao_inicial, preco_medio_inicial)
+
+    last_trade_id = int(novos["id"].max())
+    checkpoint = {
+        "last_trade_id": last_trade_id,
+        "last_time": int(novos["time"].max()),
+        "fingerprint": trade_store.fingerprint(symbol, last_trade_id),
+        "posicao": float(historico["Posição"].iloc[-1]),
+        "preco_medio": float(historico["Preço Médio"].iloc[-1]),
+        "resultado_realizado": realizado_inicial + float(historico["PnL USDT"].sum()),
+    }
+    _save(symbol, strategy, novos, historico, checkpoint)
+    return checkpoint, conferido
+
+
+def _historico_completo(symbol, strategy, checkpoint, conferido):
+    """
+    Histórico completo do par/estratégia mantido em memória: a cada chamada
+    só as linhas posteriores ao último trade já lido são buscadas no banco.
+    A versão em memória só é estendida se corresponde ao checkpoint que
+    `_atualizar_checkpoint` acabou de conferir (`conferido`); se o
+    checkpoint recuou ou foi refeito, o histórico é relido inteiro.
+    """
+    chave = (storage.db_file(), symbol, strategy)
+    with _historicos_lock:
+        em_memoria = _historicos.get(chave)
+
+    historico = None
+    if em_memoria is not None:
+        ultimo_id, fingerprint, anterior = em_memoria
+        if (ultimo_id, fingerprint) == (checkpoint["last_trade_id"], checkpoint["fingerprint"]):
+            historico = anterior
+        elif (ultimo_id, fingerprint) == conferido:
+            novos = load_history(symbol, strategy, apos_id=ultimo_id)
+            historico = tipar_historico(pd.concat([anterior, novos], ignore_index=True))
+    if historico is None:
+        historico = load_history(symbol, strategy)
+
+    with _historicos_lock:
+        _historicos[chave] = (checkpoint["last_trade_id"], checkpoint["fingerprint"], historico)
+    # Cópia rasa: quem recebe pode acrescentar colunas sem alterar a versão em memória
+    return historico.copy(deep=False)
+
+
+def carregar_historico(symbol, strategy, desde=None):
+    """
+    Atualiza o checkpoint com os trades novos e devolve (histórico a partir
+    de `desde`, em ms; checkpoint). Não depende do preço: a posição atual é
+    avaliada à parte com `posicao_atual`.
+    """
+    checkpoint, conferido = _atualizar_checkpoint(symbol, strategy)
+
+    if checkpoint is None:
+        return load_history(symbol, strategy, desde=desde), None
+
+    historico = _historico_completo(symbol, strategy, checkpoint, conferido)
+    if desde is not None:
+        historico = historico[historico["time"] >= desde].reset_index(drop=True)
+    return historico, checkpoint
+
+
+def posicao_atual(symbol, strategy, checkpoint, current_price):
+    """Linha da posição aberta do checkpoint avaliada ao preço atual (vazia sem checkpoint)."""
+    if checkpoint is None:
+        return pd.DataFrame()
+    return calcular_posicao_atual(
+        symbol, strategy, checkpoint["posicao"], checkpoint["preco_medio"], current_price
+    )
+
+
+def processar_trades_incremental(symbol, strategy, current_price, desde=None):
+    """
+    Equivalente incremental de `processar_trades_completos`: atualiza o
+    checkpoint com os trades novos e devolve o histórico (a partir de
+    `desde`, em ms) e a posição atual. O histórico completo fica em memória
+    e recebe apenas as linhas novas a cada chamada.
+    """
+    historico, checkpoint = carregar_historico(symbol, strategy, desde=desde)
+    return historico, posicao_atual(symbol, strategy, checkpoint, current_price)
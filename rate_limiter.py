@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+
+import metrics
+
+# Limite de peso por minuto da API spot da Binance (REQUEST_WEIGHT)
+WEIGHT_LIMIT = int(os.getenv("BINANCE_WEIGHT_LIMIT", "6000"))
+
+# Fração do limite que o painel se permite consumir
+WEIGHT_MARGIN = float(os.getenv("BINANCE_WEIGHT_MARGIN", "0.8"))
+
+# Pausa padrão quando a Binance responde 429/418 sem Retry-After
+DEFAULT_BACKOFF = 60.0
+
+
+class TokenBucket:
+    """
+    Balde de tokens compartilhado entre threads para o peso das requisições.
+
+    Os tokens são repostos continuamente até `capacity` por minuto e ajustados
+    pelo peso já usado que a Binance devolve nos cabeçalhos das respostas.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = float(capacity)
+        self.refill_rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.refill_rate)
+        self._updated = now
+
+    def acquire(self, weight=1):
+        """Bloqueia até haver peso disponível e o consome."""
+        weight = min(float(weight), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                else:
+                    wait = (weight - self.tokens) / self.refill_rate
+            time.sleep(wait)
+
+    def sync_used_weight(self, used):
+        """Limita os tokens disponíveis ao que sobra do peso usado informado pela Binance."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, self.capacity - used)
+
+    def block(self, seconds):
+        """Suspende novas requisições por `seconds` segundos."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+bucket = TokenBucket(WEIGHT_LIMIT * WEIGHT_MARGIN)
+
+
+def observe_response(response, *args, **kwargs):
+    """
+    Hook de resposta do requests: sincroniza o peso usado com o cabeçalho
+    X-MBX-USED-WEIGHT-1M e pausa as requisições em 429 (limite) ou 418 (ban).
+    """
+    used = response.headers.get("X-MBX-USED-WEIGHT-1M") or response.headers.get("X-MBX-USED-WEIGHT")
+    if used:
+        bucket.sync_used_weight(int(used))
+        metrics.definir("binance_peso_usado_1m", int(used))
+
+    if response.status_code in (429, 418):
+        try:
+            retry_after = float(response.headers.get("Retry-After", DEFAULT_BACKOFF))
+        except ValueError:
+            retry_after = DEFAULT_BACKOFF
+        bucket.block(retry_after)
+        metrics.incrementar("binance_bloqueios_total", status=response.status_code)
+        print(f"[Aviso] Binance respondeu {response.status_code}; pausando requisições por {retry_after:.0f}s")
+    return response
+
+
+def install(client):
+    """Registra o hook de peso na sessão HTTP do cliente."""
+    hooks = client.session.hooks["response"]
+    if observe_response not in hooks:
+        hooks.append(observe_response)
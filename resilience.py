@@ -0,0 +1,117 @@
+import os
+import random
+import threading
+import time
+
+# Tentativas extras para falhas transitórias (timeout, conexão, 5xx)
+MAX_RETRIES = int(os.getenv("BINANCE_MAX_RETRIES", "3"))
+
+# Espera base e máxima do backoff exponencial com jitter, em segundos
+RETRY_BASE_DELAY = float(os.getenv("BINANCE_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("BINANCE_RETRY_MAX_DELAY", "8"))
+
+# Falhas seguidas que abrem o disjuntor de um endpoint e tempo até nova tentativa
+BREAKER_THRESHOLD = int(os.getenv("BINANCE_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("BINANCE_BREAKER_COOLDOWN", "30"))
+
+# Código da Binance para timestamp fora da recvWindow (relógio local adiantado/atrasado)
+TIMESTAMP_ERROR_CODE = -1021
+
+
+class CircuitOpenError(Exception):
+    """Disjuntor aberto: o endpoint falhou seguidamente e não está sendo chamado."""
+
+
+def backoff_delay(tentativa):
+    """Espera antes da tentativa `tentativa` (1, 2, ...): backoff exponencial com jitter completo."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (tentativa - 1)))
+
+
+# As exceções da python-binance e do requests são importadas só ao classificar
+# uma falha: nos modos offline a biblioteca nem chega a ser carregada.
+
+def is_transient(exc):
+    """Falhas que valem nova tentativa: timeout, erro de conexão, resposta inválida ou 5xx."""
+    import requests
+    from binance.exceptions import BinanceAPIException, BinanceRequestException
+
+    if isinstance(exc, (requests.exceptions.Timeout, requests.exceptions.ConnectionError, BinanceRequestException)):
+        return True
+    return isinstance(exc, BinanceAPIException) and exc.status_code >= 500
+
+
+def is_rate_limited(exc):
+    from binance.exceptions import BinanceAPIException
+
+    return isinstance(exc, BinanceAPIException) and exc.status_code == 429
+
+
+def is_clock_drift(exc):
+    from binance.exceptions import BinanceAPIException
+
+    return isinstance(exc, BinanceAPIException) and exc.code == TIMESTAMP_ERROR_CODE
+
+
+class CircuitBreaker:
+    """
+    Disjuntor de um endpoint: após BREAKER_THRESHOLD falhas seguidas fica
+    aberto por BREAKER_COOLDOWN segundos, recusando chamadas na hora. Depois
+    libera uma única chamada de teste (meio aberto), que fecha ou reabre o
+    disjuntor conforme o resultado.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._testing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "fechado"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "meio aberto"
+        return "aberto"
+
+    def before_call(self, nome):
+        """Levanta CircuitOpenError se o endpoint não deve ser chamado agora."""
+        with self._lock:
+            estado = self.state
+            if estado == "aberto" or (estado == "meio aberto" and self._testing):
+                raise CircuitOpenError(f"{nome}: disjuntor aberto após {self.failures} falhas seguidas")
+            if estado == "meio aberto":
+                self._testing = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._testing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._testing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._testing = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(nome):
+    """Disjuntor do endpoint `nome`, compartilhado entre threads e contas."""
+    with _breakers_lock:
+        if nome not in _breakers:
+            _breakers[nome] = CircuitBreaker()
+        return _breakers[nome]
+
+
+def breaker_states():
+    """Estado de cada disjuntor já usado: {endpoint: (estado, falhas seguidas)}."""
+    with _breakers_lock:
+        return {nome: (b.state, b.failures) for nome, b in _breakers.items()}
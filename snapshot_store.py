@@ -0,0 +1,46 @@
+import pickle
+import time
+
+import storage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS painel_snapshots (
+    key TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    payload BLOB NOT NULL
+)
+"""
+
+
+def publish(payload, key="painel"):
+    """Publica o resultado de uma coleta para leitura pelo painel."""
+    blob = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+    with storage.connect() as conn:
+        conn.execute(_SCHEMA)
+        conn.execute(
+            "INSERT OR REPLACE INTO painel_snapshots (key, created_at, payload) VALUES (?, ?, ?)",
+            (key, time.time(), blob),
+        )
+
+
+def latest_created_at(key="painel"):
+    """Horário (epoch, s) da última coleta publicada, sem ler o payload; None se não houver."""
+    with storage.connect() as conn:
+        conn.execute(_SCHEMA)
+        row = conn.execute("SELECT created_at FROM painel_snapshots WHERE key = ?", (key,)).fetchone()
+    return None if row is None else row[0]
+
+
+def load_latest(key="painel"):
+    """
+    Retorna (payload, idade em segundos) da última coleta publicada,
+    ou (None, None) se o coletor ainda não publicou nada.
+    """
+    with storage.connect() as conn:
+        conn.execute(_SCHEMA)
+        row = conn.execute(
+            "SELECT created_at, payload FROM painel_snapshots WHERE key = ?", (key,)
+        ).fetchone()
+    if row is None:
+        return None, None
+    return pickle.loads(row[1]), time.time() - row[0]
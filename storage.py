@@ -0,0 +1,39 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+
+import portfolio
+
+# Banco SQLite local compartilhado pelos caches do painel
+DB_FILE = os.getenv("BINANCE_DB_FILE", "binance_data.db")
+
+
+def db_file(conta=None):
+    """
+    Banco da conta: a conta padrão usa DB_FILE e as demais um arquivo
+    próprio ao lado dele (binance_data_<conta>.db), sem misturar trades.
+    """
+    conta = conta or portfolio.conta_atual()
+    if conta == portfolio.CONTA_PADRAO:
+        return DB_FILE
+    base, ext = os.path.splitext(DB_FILE)
+    return f"{base}_{conta}{ext or '.db'}"
+
+
+@contextmanager
+def connect():
+    """
+    Abre uma conexão com o banco local da conta atual em modo WAL.
+    A transação é confirmada ao sair do bloco ou desfeita em caso de erro.
+    """
+    conn = sqlite3.connect(db_file(), timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
@@ -1,140 +1,239 @@
+import numpy as np
 import pandas as pd
 
-def format_pct(value):
-    return f"{value:.2f}%" if pd.notnull(value) else "-"
+# Esquema do histórico: categorias para textos repetidos e horário em ms (int64)
+COLUNAS_CATEGORICAS = ["Estratégia", "symbol", "Tipo"]
+COLUNAS_NUMERICAS = ["Qtd", "Preço", "Total", "PnL USDT", "PnL %", "Posição", "Preço Médio"]
+
+# Escala (log) máxima resolvida de uma vez pelo motor de preço médio; exp(±700) já estoura o float64
+LIMITE_ESCALA = 300.0
+
+COLUNAS_EXIBICAO = [
+    "Estratégia", "symbol", "Tipo", "Qtd", "Preço", "Total",
+    "PnL USDT", "PnL %", "📍", "Contexto", "Data/Hora",
+]
+
+
+def tipar_historico(df):
+    """
+    Aplica o esquema do histórico: float64 para valores, categorias para
+    estratégia/par/tipo e int64 (ms) para o horário. Também deve ser usada
+    depois de concatenar históricos de pares diferentes.
+    """
+    if df.empty:
+        return df
+    tipos = {c: "category" for c in COLUNAS_CATEGORICAS + ["Conta"] if c in df.columns}
+    tipos.update({c: "float64" for c in COLUNAS_NUMERICAS})
+    tipos["time"] = "int64"
+    return df.astype(tipos)
+
+
+def _resolver_trecho(price, qty, is_buyer, posicao_inicial, preco_medio_inicial):
+    """
+    Resolve de uma vez um trecho de trades. O custo da posição (preço médio
+    × |quantidade|) segue a recorrência custo_i = a_i * custo_{i-1} + b_i,
+    resolvida por segmentos entre os pontos em que o preço médio é
+    reiniciado. Devolve também a escala acumulada (log dos fatores a_i).
+    """
+    sinal_qty = np.where(is_buyer, qty, -qty)
+    posicao = np.cumsum(np.concatenate(([posicao_inicial], sinal_qty)))[1:]
+    anterior = np.concatenate(([posicao_inicial], posicao[:-1]))
+    custo_inicial = preco_medio_inicial * abs(posicao_inicial)
+
+    fecha_short = is_buyer & (anterior < 0)
+    fecha_long = ~is_buyer & (anterior > 0)
+    fechamento = fecha_short | fecha_long
+
+    # Zerou a posição (preço médio = 0) ou virou de short para long (preço médio = preço)
+    reinicio = (fechamento & (posicao == 0)) | (fecha_short & (posicao > 0))
+    valor_reinicio = np.where(fecha_short & (posicao > 0), price * posicao, 0.0)
+
+    # Linhas além de LIMITE_ESCALA podem estourar; _motor_preco_medio as descarta e recomeça
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        # Reduções mantêm o preço médio: o custo acompanha a quantidade restante
+        fator = np.where(fechamento & ~reinicio, np.abs(posicao) / np.abs(anterior), 1.0)
+        log_fator = np.where(reinicio, 0.0, np.log(fator))
+        aporte = np.where(fechamento, 0.0, price * qty)
+
+        segmento = np.cumsum(reinicio)
+        escala = pd.Series(log_fator).groupby(segmento).cumsum().to_numpy()
+        termo = np.where(reinicio, valor_reinicio, aporte * np.exp(-escala))
+        acumulado = pd.Series(termo).groupby(segmento).cumsum().to_numpy()
+        acumulado = acumulado + np.where(segmento == 0, custo_inicial, 0.0)
+        custo = np.exp(escala) * acumulado
+
+        custo_anterior = np.concatenate(([custo_inicial], custo[:-1]))
+        preco_medio_anterior = np.where(anterior != 0, custo_anterior / np.abs(anterior), 0.0)
+        preco_medio = np.where(posicao != 0, custo / np.abs(posicao), 0.0)
+
+        lucro = np.where(
+            fecha_short,
+            (preco_medio_anterior - price) * np.minimum(np.abs(anterior), qty),
+            (price - preco_medio_anterior) * qty,
+        )
+        lucro_pct = np.where(
+            fecha_short,
+            np.where(price > 0, (preco_medio_anterior / price - 1) * 100, 0.0),
+            np.where(preco_medio_anterior > 0, (price / preco_medio_anterior - 1) * 100, 0.0),
+        )
+
+    lucro = np.where(fechamento, lucro, np.nan)
+    lucro_pct = np.where(fechamento, lucro_pct, np.nan)
+    return lucro, lucro_pct, posicao, preco_medio, escala
+
+
+def _motor_preco_medio(price, qty, is_buyer, posicao_inicial=0.0, preco_medio_inicial=0.0):
+    """
+    Motor de preço médio vetorizado.
+
+    Reproduz as regras do histórico trade a trade (encerramento de short,
+    ampliação de posição, encerramento de long e virada long → short), mas
+    calcula todas as linhas de uma vez com NumPy.
+
+    Históricos que nunca zeram a posição acumulam uma escala sem limite;
+    quando ela passa de LIMITE_ESCALA, o cálculo é retomado a partir da
+    posição e do preço médio da última linha válida, então exp(±escala)
+    nunca estoura o float64.
+
+    `posicao_inicial` e `preco_medio_inicial` permitem retomar o cálculo a
+    partir de um estado salvo, aplicando apenas os trades novos.
+    """
+    n = len(price)
+    partes = []
+    inicio, janela = 0, n
+    while inicio < n:
+        fim = min(n, inicio + janela)
+        *colunas, escala = _resolver_trecho(
+            price[inicio:fim], qty[inicio:fim], is_buyer[inicio:fim], posicao_inicial, preco_medio_inicial
+        )
+        fora = np.flatnonzero(~(np.abs(escala) <= LIMITE_ESCALA))
+        aceitos = len(escala) if fora.size == 0 else max(1, int(fora[0]))
+        partes.append([c[:aceitos] for c in colunas])
+        posicao_inicial, preco_medio_inicial = colunas[2][aceitos - 1], colunas[3][aceitos - 1]
+        inicio += aceitos
+        # Após um corte, o próximo trecho tende a ter tamanho parecido
+        janela = n if fora.size == 0 else max(2 * aceitos, 1024)
+
+    if not partes:
+        vazio = np.empty(0, dtype="float64")
+        return vazio, vazio, vazio, vazio
+    if len(partes) == 1:
+        return tuple(partes[0])
+    return tuple(np.concatenate(c) for c in zip(*partes))
+
+
+def calcular_historico(df, strategy_name, posicao_inicial=0.0, preco_medio_inicial=0.0):
+    """
+    Aplica o motor de preço médio aos trades de um único par, já ordenados.
+    Retorna o histórico numérico; PnL USDT e PnL % ficam como NaN nas linhas
+    que não realizam resultado.
+    """
+    price = df["price"].to_numpy(dtype="float64")
+    qty = df["qty"].to_numpy(dtype="float64")
+    is_buyer = df["isBuyer"].to_numpy(dtype=bool)
+
+    lucro, lucro_pct, posicao, preco_medio = _motor_preco_medio(
+        price, qty, is_buyer, posicao_inicial, preco_medio_inicial
+    )
+
+    return tipar_historico(pd.DataFrame({
+        "Estratégia": strategy_name,
+        "symbol": df["symbol"].to_numpy(),
+        "Tipo": np.where(is_buyer, "Compra", "Venda"),
+        "Qtd": qty,
+        "Preço": price,
+        "Total": df["quoteQty"].to_numpy(dtype="float64"),
+        "PnL USDT": lucro,
+        "PnL %": lucro_pct,
+        "Posição": posicao,
+        "Preço Médio": preco_medio,
+        "time": df["time"].to_numpy(dtype="int64"),
+        "Data/Hora": pd.to_datetime(df["time"].to_numpy(), unit="ms"),
+    }))
+
+
+def calcular_posicao_atual(symbol, strategy_name, quantidade_total, preco_medio_atual, current_price):
+    """Monta a linha de posição aberta com o PnL flutuante ao preço atual, avaliada agora."""
+    if abs(quantidade_total) <= 0.00001:
+        return pd.DataFrame()
+
+    if quantidade_total > 0:
+        pnl_flutuante = (current_price - preco_medio_atual) * quantidade_total
+        pnl_pct = ((current_price / preco_medio_atual) - 1) * 100 if preco_medio_atual > 0 else 0
+    else:
+        pnl_flutuante = (preco_medio_atual - current_price) * abs(quantidade_total)
+        pnl_pct = ((preco_medio_atual / current_price) - 1) * 100 if current_price > 0 else 0
+
+    agora = pd.Timestamp.now(tz="UTC").tz_localize(None)
+    return tipar_historico(pd.DataFrame([{
+        "Estratégia": strategy_name,
+        "symbol": symbol,
+        "Tipo": "Posição Atual",
+        "Qtd": quantidade_total,
+        "Preço": current_price,
+        "Total": current_price * quantidade_total,
+        "PnL USDT": pnl_flutuante,
+        "PnL %": pnl_pct,
+        "Posição": quantidade_total,
+        "Preço Médio": preco_medio_atual,
+        "time": agora.value // 1_000_000,
+        "Data/Hora": agora,
+    }]))
 
-def format_usdt(value):
-    return f"${value:.2f}" if pd.notnull(value) else "-"
 
 def processar_trades_completos(df_orders, df_price, strategy_name):
+    """
+    Calcula o histórico de operações e a posição atual do par.
+
+    Retorna dois DataFrames numéricos (histórico e posição atual). A
+    formatação dos valores fica a cargo da exibição.
+    """
     symbol = df_orders["symbol"].iloc[0]
     current_price = float(df_price[df_price["symbol"] == symbol]["current_price"].values[0])
-    df = df_orders[df_orders["symbol"] == symbol].sort_values("time").copy()
-
-    historico = []
-    preco_medio = 0
-    quantidade_total = 0
-    resultado_realizado = 0
-
-    for _, row in df.iterrows():
-        row_time = pd.to_datetime(row["time"], unit="ms")
-        price = float(row["price"])
-        qty = float(row["qty"])
-        quote = float(row["quoteQty"])
-
-        if row["isBuyer"]:  # Compra
-            if quantidade_total < 0:
-                # Encerrando short
-                lucro = (preco_medio - price) * min(abs(quantidade_total), qty)
-                lucro_pct = ((preco_medio / price) - 1) * 100 if price > 0 else 0
-                resultado_realizado += lucro
-
-                quantidade_total += qty
-                if quantidade_total > 0:
-                    preco_medio = price  # nova compra
-                elif quantidade_total == 0:
-                    preco_medio = 0
-
-                historico.append({
-                    "Estratégia": strategy_name,
-                    "symbol": symbol,
-                    "Tipo": "Compra",
-                    "Qtd": qty,
-                    "Preço": format_usdt(price),
-                    "Total": format_usdt(quote),
-                    "PnL USDT": format_usdt(lucro),
-                    "PnL %": format_pct(lucro_pct),
-                    "📍": "📈" if lucro > 0 else "📉" if lucro < 0 else "⬜",
-                    "Contexto": f"Compra de {qty:.2f} {symbol[:-4]} a {format_usdt(price)}",
-                    "Data/Hora": row_time
-                })
-            else:
-                preco_total = preco_medio * quantidade_total + price * qty
-                quantidade_total += qty
-                preco_medio = preco_total / quantidade_total if quantidade_total != 0 else 0
-
-                historico.append({
-                    "Estratégia": strategy_name,
-                    "symbol": symbol,
-                    "Tipo": "Compra",
-                    "Qtd": qty,
-                    "Preço": format_usdt(price),
-                    "Total": format_usdt(quote),
-                    "PnL USDT": "-",
-                    "PnL %": "-",
-                    "📍": "",
-                    "Contexto": f"Compra de {qty:.2f} {symbol[:-4]} a {format_usdt(price)}",
-                    "Data/Hora": row_time
-                })
-
-        else:  # Venda
-            if quantidade_total > 0:
-                # Encerrando posição comprada
-                lucro = (price - preco_medio) * qty
-                lucro_pct = ((price / preco_medio) - 1) * 100 if preco_medio > 0 else 0
-                resultado_realizado += lucro
-
-                quantidade_total -= qty
-                if quantidade_total == 0:
-                    preco_medio = 0
-
-                historico.append({
-                    "Estratégia": strategy_name,
-                    "symbol": symbol,
-                    "Tipo": "Venda",
-                    "Qtd": qty,
-                    "Preço": format_usdt(price),
-                    "Total": format_usdt(quote),
-                    "PnL USDT": format_usdt(lucro),
-                    "PnL %": format_pct(lucro_pct),
-                    "📍": "📈" if lucro > 0 else "📉" if lucro < 0 else "⬜",
-                    "Contexto": f"Venda de {qty:.2f} {symbol[:-4]} a {format_usdt(price)}",
-                    "Data/Hora": row_time
-                })
-
-            else:
-                # Abrindo ou ampliando posição short
-                preco_total = preco_medio * abs(quantidade_total) + price * qty
-                quantidade_total -= qty
-                preco_medio = preco_total / abs(quantidade_total) if quantidade_total != 0 else 0
-
-                historico.append({
-                    "Estratégia": strategy_name,
-                    "symbol": symbol,
-                    "Tipo": "Venda",
-                    "Qtd": qty,
-                    "Preço": format_usdt(price),
-                    "Total": format_usdt(quote),
-                    "PnL USDT": "-",
-                    "PnL %": "-",
-                    "📍": "",
-                    "Contexto": f"Venda de {qty:.2f} {symbol[:-4]} a {format_usdt(price)} (abrindo short)",
-                    "Data/Hora": row_time
-                })
-
-    # Posição atual
-    if abs(quantidade_total) > 0.00001:
-        if quantidade_total > 0:
-            pnl_flutuante = (current_price - preco_medio) * quantidade_total
-            pnl_pct = ((current_price / preco_medio) - 1) * 100 if preco_medio > 0 else 0
-        else:
-            pnl_flutuante = (preco_medio - current_price) * abs(quantidade_total)
-            pnl_pct = ((preco_medio / current_price) - 1) * 100 if current_price > 0 else 0
-
-        df_posicao = pd.DataFrame([{
-            "Estratégia": strategy_name,
-            "symbol": symbol,
-            "Tipo": "Posição Atual",
-            "Qtd": quantidade_total,
-            "Preço": format_usdt(current_price),
-            "Total": format_usdt(current_price * quantidade_total),
-            "PnL USDT": format_usdt(pnl_flutuante),
-            "PnL %": format_pct(pnl_pct),
-            "📍": "🟢" if pnl_flutuante >= 0 else "🔴",
-            "Contexto": f"Saldo atual de {quantidade_total:.4f} {symbol[:-4]} a {format_usdt(current_price)}",
-            "Data/Hora": pd.NaT
-        }])
-    else:
-        df_posicao = pd.DataFrame()
-
-    return pd.DataFrame(historico), df_posicao
+    df = df_orders[df_orders["symbol"] == symbol].sort_values("time", kind="stable")
+
+    historico = calcular_historico(df, strategy_name)
+
+    quantidade_total = historico["Posição"].iloc[-1] if not historico.empty else 0.0
+    preco_medio_atual = historico["Preço Médio"].iloc[-1] if not historico.empty else 0.0
+    df_posicao = calcular_posicao_atual(symbol, strategy_name, quantidade_total, preco_medio_atual, current_price)
+
+    return historico, df_posicao
+
+
+def _contexto(df, posicao):
+    """
+    Descrição de cada linha ("Compra de 10.00 XRP a $0.52"), com a venda que
+    abre ou amplia um short marcada: é a venda sem PnL realizado, já que só
+    vendas sobre posição comprada realizam resultado.
+    """
+    token = df["symbol"].astype(str).str[:-4]
+    preco = df["Preço"].map("${:.2f}".format)
+    texto = df["Tipo"].astype(str) + " de " + df["Qtd"].map("{:.2f}".format) + " " + token + " a " + preco
+    abrindo_short = (df["Tipo"] == "Venda") & df["PnL USDT"].isna()
+    texto = texto.where(~abrindo_short, texto + " (abrindo short)")
+    saldo = "Saldo atual de " + df["Qtd"].map("{:.4f}".format) + " " + token + " a " + preco
+    return texto.where(~posicao, saldo)
+
+
+def preparar_exibicao(df):
+    """
+    Seleciona as colunas exibidas (com a conta, quando presente) e acrescenta
+    o indicador visual (📍) e o contexto de cada linha; só deve receber as
+    linhas exibidas (a página atual).
+    Os valores continuam numéricos; a formatação é feita pela tabela do painel.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=COLUNAS_EXIBICAO)
+
+    pnl = df["PnL USDT"]
+    posicao = df["Tipo"] == "Posição Atual"
+    realizado = pnl.notna() & ~posicao
+
+    indicador = np.select(
+        [posicao & (pnl >= 0), posicao, realizado & (pnl > 0), realizado & (pnl < 0), realizado],
+        ["🟢", "🔴", "📈", "📉", "⬜"],
+        "",
+    )
+    colunas = (["Conta"] if "Conta" in df.columns else []) + COLUNAS_EXIBICAO
+    return df.assign(**{"📍": pd.Categorical(indicador), "Contexto": _contexto(df, posicao)})[colunas]
@@ -0,0 +1,237 @@
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+
+import websockets
+
+import binance_client
+import portfolio
+import trade_store
+
+# Endpoint base dos streams; pode apontar para um servidor WebSocket local de testes
+WS_BASE_URL = os.getenv("BINANCE_WS_URL", "wss://stream.binance.com:9443")
+
+# Renovação do listenKey (a Binance expira a chave após 60 minutos sem keepalive)
+KEEPALIVE_INTERVAL = 30 * 60
+
+# Espera máxima entre tentativas de reconexão, em segundos
+MAX_RECONNECT_DELAY = 60
+
+# Status em que a ordem continua no livro
+_OPEN_STATUSES = {"NEW", "PARTIALLY_FILLED"}
+
+
+class StreamState:
+    """
+    Estado em memória (preços, saldos, ordens abertas) mantido pelos streams
+    de miniTicker e de dados do usuário da Binance, em uma thread própria.
+
+    Enquanto `live` é verdadeiro, o estado está sincronizado com a corretora e
+    pode substituir as consultas REST. A cada (re)conexão o estado é
+    ressincronizado via REST antes de voltar a ser considerado válido.
+    """
+
+    def __init__(self, symbols, client=None, user_stream=True, base_url=None):
+        self.symbols = [s.upper() for s in symbols]
+        self.client = client or binance_client.get_account_client()
+        self.user_stream = user_stream
+        self.base_url = base_url or WS_BASE_URL
+        self.live = False
+        self.last_event = 0.0
+        self._prices = {}
+        self._balances = {}
+        self._balance_times = {}
+        self._orders = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Leitura do estado
+
+    def get_prices(self, symbols):
+        """Retorna {symbol: preço} ou None se algum par ainda não tem preço."""
+        with self._lock:
+            if any(s not in self._prices for s in symbols):
+                return None
+            return {s: self._prices[s] for s in symbols}
+
+    def get_balances(self):
+        """Retorna o índice {asset: (free, locked)}."""
+        with self._lock:
+            return dict(self._balances)
+
+    def get_open_orders(self, symbol=None):
+        """Retorna as ordens abertas no formato de get_open_orders."""
+        with self._lock:
+            return [
+                dict(o) for o in self._orders.values()
+                if symbol is None or o["symbol"] == symbol
+            ]
+
+    # Processamento das mensagens
+
+    def handle_message(self, msg):
+        """Aplica ao estado uma mensagem do stream combinado ({"stream", "data"})."""
+        data = msg.get("data", msg)
+        evento = data.get("e")
+        self.last_event = time.time()
+
+        if evento == "24hrMiniTicker":
+            with self._lock:
+                self._prices[data["s"]] = float(data["c"])
+        elif evento == "outboundAccountPosition":
+            self._on_account_position(data)
+        elif evento == "executionReport":
+            self._on_execution_report(data)
+
+    def _on_account_position(self, data):
+        atualizado = int(data.get("u", data.get("E", 0)))
+        with self._lock:
+            for b in data["B"]:
+                asset = b["a"]
+                if atualizado < self._balance_times.get(asset, 0):
+                    continue
+                self._balances[asset] = (float(b["f"]), float(b["l"]))
+                self._balance_times[asset] = atualizado
+
+    def _on_execution_report(self, data):
+        symbol = data["s"]
+        order_id = int(data["i"])
+
+        with self._lock:
+            if data["X"] in _OPEN_STATUSES:
+                anterior = self._orders.get(order_id, {})
+                self._orders[order_id] = {
+                    "symbol": symbol,
+                    "orderId": order_id,
+                    "side": data["S"],
+                    "type": data.get("o"),
+                    "origQty": data["q"],
+                    "executedQty": data.get("z", "0"),
+                    "price": data["p"],
+                    "status": data["X"],
+                    "time": anterior.get("time", int(data.get("O", data["E"]))),
+                    "updateTime": int(data["E"]),
+                }
+            else:
+                self._orders.pop(order_id, None)
+
+        if data.get("x") == "TRADE":
+            trade_store.save_trades(symbol, [{
+                "id": int(data["t"]),
+                "orderId": order_id,
+                "price": data["L"],
+                "qty": data["l"],
+                "quoteQty": data.get("Y", float(data["L"]) * float(data["l"])),
+                "commission": data.get("n") or 0,
+                "commissionAsset": data.get("N"),
+                "time": int(data["T"]),
+                "isBuyer": data["S"] == "BUY",
+                "isMaker": bool(data.get("m", False)),
+            }])
+
+    # Ciclo de vida
+
+    def _resync(self):
+        """Recarrega via REST tudo o que pode ter mudado enquanto o stream esteve fora."""
+        for symbol in self.symbols:
+            trade_store.sync_trades(self.client, symbol)
+
+        prices = {t["symbol"]: float(t["price"]) for t in self.client.get_symbol_ticker()}
+        with self._lock:
+            for symbol in self.symbols:
+                if symbol in prices:
+                    self._prices[symbol] = prices[symbol]
+
+        if self.user_stream:
+            info = self.client.get_account()
+            orders = self.client.get_open_orders()
+            # Horário do servidor, o mesmo relógio do campo "u" dos eventos de saldo
+            atualizado = int(info.get("updateTime", 0))
+            with self._lock:
+                self._balances = {
+                    b["asset"]: (float(b["free"]), float(b["locked"])) for b in info["balances"]
+                }
+                self._balance_times = {asset: atualizado for asset in self._balances}
+                self._orders = {int(o["orderId"]): o for o in orders}
+
+    def _stream_url(self, listen_key):
+        streams = [f"{s.lower()}@miniTicker" for s in self.symbols]
+        if listen_key:
+            streams.insert(0, listen_key)
+        return f"{self.base_url}/stream?streams={'/'.join(streams)}"
+
+    async def _keepalive(self, listen_key):
+        while True:
+            await asyncio.sleep(KEEPALIVE_INTERVAL)
+            await asyncio.to_thread(self.client.stream_keepalive, listen_key)
+
+    async def _connect_once(self):
+        listen_key = None
+        if self.user_stream:
+            listen_key = await asyncio.to_thread(self.client.stream_get_listen_key)
+
+        async with websockets.connect(self._stream_url(listen_key)) as ws:
+            await asyncio.to_thread(self._resync)
+            self.live = True
+            keepalive = asyncio.create_task(self._keepalive(listen_key)) if listen_key else None
+            try:
+                async for raw in ws:
+                    if self._stop.is_set():
+                        break
+                    self.handle_message(json.loads(raw))
+            finally:
+                self.live = False
+                if keepalive:
+                    keepalive.cancel()
+
+    async def _run(self):
+        espera = 1
+        while not self._stop.is_set():
+            try:
+                await self._connect_once()
+                espera = 1
+            except Exception as e:
+                self.live = False
+                print(f"[Erro] stream Binance: {e}; reconectando em {espera}s")
+            if self._stop.is_set():
+                break
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, MAX_RECONNECT_DELAY)
+
+    def start(self):
+        """Inicia o stream em uma thread daemon."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            # A thread herda a conta de quem iniciou o stream (banco local e caches)
+            ctx = contextvars.copy_context()
+            self._thread = threading.Thread(target=lambda: ctx.run(asyncio.run, self._run()), daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Sinaliza o fim do stream; a thread encerra na próxima mensagem."""
+        self._stop.set()
+        self.live = False
+
+
+_instances = {}
+_instance_lock = threading.Lock()
+
+
+def start_stream(symbols):
+    """
+    Inicia (uma única vez por processo e conta) o stream dos pares informados
+    e registra o estado em `binance_client` para substituir as consultas REST.
+    A conta é a selecionada com `portfolio.usar_conta`.
+    """
+    conta = portfolio.conta_atual()
+    with _instance_lock:
+        if conta not in _instances:
+            _instances[conta] = StreamState(symbols)
+            binance_client.attach_stream(_instances[conta], conta)
+            _instances[conta].start()
+    return _instances[conta]
@@ -0,0 +1,23 @@
+import pytest
+
+import storage
+from benchmark import _casos
+
+pytest.importorskip("pytest_benchmark")
+
+# Menor tamanho de benchmark.TAMANHOS: rápido o bastante para a suíte
+TAMANHO = 1_000
+
+
+@pytest.fixture(scope="module")
+def casos():
+    """Casos do benchmark.py; storage.DB_FILE volta ao original ao fim do módulo."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(storage, "DB_FILE", storage.DB_FILE)
+        yield dict(_casos(TAMANHO))
+
+
+@pytest.mark.parametrize("nome", ["processar_trades_completos", "daily_rollup.rebuild", "calcular_entrada_liquida_e_qtd"])
+def test_benchmark(benchmark, casos, nome):
+    benchmark.group = f"{TAMANHO} fills"
+    benchmark(casos[nome])
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from storytelling_calculator import _motor_preco_medio
+
+
+def _motor_em_laco(price, qty, is_buyer, posicao_inicial=0.0, preco_medio_inicial=0.0):
+    """Regras do loop original de processar_trades_completos, trade a trade."""
+    n = len(price)
+    lucro, lucro_pct = np.full(n, np.nan), np.full(n, np.nan)
+    posicao, preco_medio = np.empty(n), np.empty(n)
+    pos, pm = posicao_inicial, preco_medio_inicial
+    for i, (p, q, compra) in enumerate(zip(price.tolist(), qty.tolist(), is_buyer.tolist())):
+        if compra:
+            if pos < 0:
+                lucro[i] = (pm - p) * min(abs(pos), q)
+                lucro_pct[i] = (pm / p - 1) * 100 if p > 0 else 0.0
+                pos += q
+                if pos > 0:
+                    pm = p
+                elif pos == 0:
+                    pm = 0.0
+            else:
+                total = pm * pos + p * q
+                pos += q
+                pm = total / pos if pos != 0 else 0.0
+        else:
+            if pos > 0:
+                lucro[i] = (p - pm) * q
+                lucro_pct[i] = (p / pm - 1) * 100 if pm > 0 else 0.0
+                pos -= q
+                if pos == 0:
+                    pm = 0.0
+            else:
+                total = pm * abs(pos) + p * q
+                pos -= q
+                pm = total / abs(pos) if pos != 0 else 0.0
+        posicao[i], preco_medio[i] = pos, pm
+    return lucro, lucro_pct, posicao, preco_medio
+
+
+def _comparar(price, qty, is_buyer, *estado):
+    esperado = _motor_em_laco(price, qty, is_buyer, *estado)
+    obtido = _motor_preco_medio(price, qty, is_buyer, *estado)
+    for nome, e, o in zip(["lucro", "lucro_pct", "posicao", "preco_medio"], esperado, obtido):
+        assert np.isfinite(o).sum() == np.isfinite(e).sum(), nome
+        np.testing.assert_allclose(o, e, rtol=1e-8, atol=1e-8, equal_nan=True, err_msg=nome)
+
+
+def test_estoque_base_que_nunca_zera():
+    # Compra 100 e alterna compra 10 / venda 10: a escala acumulada passaria do limite do float64
+    n = 20_000
+    rng = np.random.default_rng(1)
+    price = np.round(0.5 + np.cumsum(rng.normal(0, 0.001, n)).clip(-0.4, None), 4)
+    qty = np.full(n, 10.0)
+    qty[0] = 100.0
+    is_buyer = np.arange(n) % 2 == 1
+    is_buyer[0] = True
+    _comparar(price, qty, is_buyer)
+
+
+def test_viradas_long_short():
+    n = 20_000
+    rng = np.random.default_rng(2)
+    price = np.round(1 + np.abs(np.cumsum(rng.normal(0, 0.01, n))), 4)
+    qty = np.round(rng.lognormal(2.0, 0.8, n), 1) + 0.1
+    regime = np.cumsum(rng.random(n) < 0.02) % 2 == 0
+    is_buyer = np.where(rng.random(n) < 0.7, regime, ~regime)
+    _comparar(price, qty, is_buyer)
+
+
+@pytest.mark.parametrize("estado", [(0.0, 0.0), (250.0, 0.42), (-80.0, 1.3)])
+def test_retomada_de_estado(estado):
+    n = 5_000
+    rng = np.random.default_rng(3)
+    price = np.round(rng.uniform(0.3, 0.7, n), 4)
+    qty = np.round(rng.uniform(1, 20, n), 1)
+    is_buyer = rng.random(n) < 0.5
+    _comparar(price, qty, is_buyer, *estado)
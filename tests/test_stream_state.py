@@ -0,0 +1,106 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from websockets.asyncio.server import serve
+
+import storage
+import trade_store
+from stream_state import StreamState
+
+# updateTime do get_account no relógio do servidor, bem atrás do relógio local
+ATUALIZADO_NO_SERVIDOR = 1_000
+
+
+class ClienteFalso:
+    """REST mínimo usado pelo StreamState na (re)sincronização."""
+
+    def stream_get_listen_key(self):
+        return "chave"
+
+    def stream_keepalive(self, listen_key):
+        pass
+
+    def get_symbol_ticker(self):
+        return [{"symbol": "XRPUSDT", "price": "0.5"}]
+
+    def get_account(self):
+        return {"updateTime": ATUALIZADO_NO_SERVIDOR, "balances": [{"asset": "XRP", "free": "1", "locked": "0"}]}
+
+    def get_open_orders(self):
+        return []
+
+    def get_my_trades(self, symbol, fromId=0, limit=1000, **params):
+        return []
+
+
+MENSAGENS = [
+    {"stream": "xrpusdt@miniTicker", "data": {"e": "24hrMiniTicker", "s": "XRPUSDT", "c": "0.61"}},
+    # Evento posterior ao snapshot no relógio do servidor: aplicado
+    {"stream": "chave", "data": {
+        "e": "outboundAccountPosition", "E": 2_100, "u": 2_000, "B": [{"a": "XRP", "f": "5", "l": "0"}],
+    }},
+    # Evento mais antigo que o último aplicado: descartado
+    {"stream": "chave", "data": {
+        "e": "outboundAccountPosition", "E": 1_600, "u": 1_500, "B": [{"a": "XRP", "f": "9", "l": "0"}],
+    }},
+    {"stream": "chave", "data": {
+        "e": "executionReport", "E": 2_200, "s": "XRPUSDT", "i": 7, "S": "BUY", "o": "LIMIT", "q": "10",
+        "z": "0", "p": "0.6", "X": "NEW", "x": "NEW", "O": 2_200,
+    }},
+    {"stream": "chave", "data": {
+        "e": "executionReport", "E": 2_300, "s": "XRPUSDT", "i": 8, "S": "BUY", "o": "LIMIT", "q": "2",
+        "z": "2", "p": "0.6", "X": "FILLED", "x": "TRADE", "t": 42, "L": "0.6", "l": "2", "T": 2_300,
+    }},
+]
+
+
+@pytest.fixture
+def servidor():
+    """Servidor WebSocket local que envia MENSAGENS a cada conexão; devolve (url, caminhos pedidos)."""
+    caminhos = []
+    pronto = threading.Event()
+    endereco = {}
+
+    async def atender(ws):
+        caminhos.append(ws.request.path)
+        for msg in MENSAGENS:
+            await ws.send(json.dumps(msg))
+        await asyncio.Future()
+
+    async def principal():
+        async with serve(atender, "127.0.0.1", 0) as server:
+            endereco["porta"] = server.sockets[0].getsockname()[1]
+            pronto.set()
+            await asyncio.Future()
+
+    threading.Thread(target=lambda: asyncio.run(principal()), daemon=True).start()
+    assert pronto.wait(5)
+    return f"ws://127.0.0.1:{endereco['porta']}", caminhos
+
+
+def _esperar(condicao, limite=5.0):
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        if condicao():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_stream_contra_servidor_local(servidor, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DB_FILE", str(tmp_path / "stream.db"))
+    url, caminhos = servidor
+    state = StreamState(["XRPUSDT"], client=ClienteFalso(), base_url=url).start()
+    try:
+        assert _esperar(lambda: state.live and state.get_open_orders())
+        assert caminhos == ["/stream?streams=chave/xrpusdt@miniTicker"]
+        assert state.get_prices(["XRPUSDT"]) == {"XRPUSDT": 0.61}
+        assert state.get_balances()["XRP"] == (5.0, 0.0)
+        assert [o["orderId"] for o in state.get_open_orders("XRPUSDT")] == [7]
+
+        assert _esperar(lambda: trade_store.last_trade_id("XRPUSDT") == 42)
+    finally:
+        state.stop()
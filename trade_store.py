@@ -0,0 +1,232 @@
+import numpy as np
+
+import storage
+
+# Tamanho máximo de página aceito pelo endpoint myTrades
+PAGE_LIMIT = 1000
+
+# Trades mais recentes somados no fingerprint; os anteriores entram apenas na contagem
+FINGERPRINT_RECENT = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    symbol TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    order_id INTEGER,
+    price REAL NOT NULL,
+    qty REAL NOT NULL,
+    quote_qty REAL NOT NULL,
+    commission REAL,
+    commission_asset TEXT,
+    time INTEGER NOT NULL,
+    is_buyer INTEGER NOT NULL,
+    is_maker INTEGER,
+    PRIMARY KEY (symbol, id)
+)
+"""
+
+_COLUMNS = "symbol, id, order_id, price, qty, quote_qty, commission, commission_asset, time, is_buyer, is_maker"
+
+# Colunas tipadas dos trades (nome da API: dtype), compartilhadas pelos consumidores
+TRADE_DTYPES = {
+    "id": "int64",
+    "orderId": "int64",
+    "price": "float64",
+    "qty": "float64",
+    "quoteQty": "float64",
+    "commission": "float64",
+    "commissionAsset": object,
+    "time": "int64",
+    "isBuyer": bool,
+    "isMaker": bool,
+}
+
+_FRAME_SELECT = """id, COALESCE(order_id, 0), price, qty, quote_qty, commission, commission_asset,
+                   time, is_buyer, COALESCE(is_maker, 0)"""
+
+
+def _ensure_schema(conn):
+    conn.execute(_SCHEMA)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trades_time ON trades (symbol, time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trades_order ON trades (symbol, order_id)")
+
+
+def to_columns(trades):
+    """
+    Converte trades no formato da API (preços e quantidades em texto) em
+    colunas NumPy tipadas conforme TRADE_DTYPES, uma conversão por coluna.
+    """
+    padroes = {"orderId": 0, "commission": 0, "commissionAsset": None, "isMaker": False}
+    return {
+        nome: np.array([t.get(nome, padroes.get(nome)) for t in trades], dtype=dtype)
+        for nome, dtype in TRADE_DTYPES.items()
+    }
+
+
+def _from_row(row):
+    return {
+        "symbol": row[0],
+        "id": row[1],
+        "orderId": row[2],
+        "price": row[3],
+        "qty": row[4],
+        "quoteQty": row[5],
+        "commission": row[6],
+        "commissionAsset": row[7],
+        "time": row[8],
+        "isBuyer": bool(row[9]),
+        "isMaker": bool(row[10]),
+    }
+
+
+def last_trade_id(symbol):
+    """Retorna o maior id de trade já armazenado para o par, ou None."""
+    with storage.connect() as conn:
+        _ensure_schema(conn)
+        row = conn.execute("SELECT MAX(id) FROM trades WHERE symbol = ?", (symbol,)).fetchone()
+    return row[0]
+
+
+def save_trades(symbol, trades):
+    """
+    Grava os trades no armazenamento local, ignorando ids já existentes.
+    Aceita a lista da API ou as colunas de `to_columns`.
+    """
+    if len(trades) == 0:
+        return
+    colunas = trades if isinstance(trades, dict) else to_columns(trades)
+    rows = zip(
+        [symbol] * len(colunas["id"]),
+        *(colunas[nome].tolist() for nome in TRADE_DTYPES),
+    )
+    with storage.connect() as conn:
+        _ensure_schema(conn)
+        conn.executemany(
+            f"INSERT OR IGNORE INTO trades ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+
+def sync_trades(client, symbol):
+    """
+    Busca apenas os trades mais novos que o último id armazenado,
+    paginando com fromId até esgotar o histórico.
+    Retorna a quantidade de trades novos recebidos.
+    """
+    last_id = last_trade_id(symbol)
+    from_id = 0 if last_id is None else last_id + 1
+    novos = 0
+
+    while True:
+        page = client.get_my_trades(symbol=symbol, fromId=from_id, limit=PAGE_LIMIT)
+        if not page:
+            break
+        colunas = to_columns(page)
+        save_trades(symbol, colunas)
+        novos += len(page)
+        if len(page) < PAGE_LIMIT:
+            break
+        from_id = int(colunas["id"].max()) + 1
+
+    return novos
+
+
+def fetch_window(client, symbol, start_ms, end_ms):
+    """
+    Busca na API, sem gravar, os trades do par com horário em
+    [`start_ms`, `end_ms`): a primeira página pela janela de tempo e as
+    seguintes por fromId. Serve para pares sem histórico local, em que um
+    sync a partir do id 0 percorreria todo o histórico da conta.
+    Retorna colunas como `load_columns`.
+    """
+    paginas = []
+    page = client.get_my_trades(symbol=symbol, startTime=start_ms, endTime=end_ms - 1, limit=PAGE_LIMIT)
+    while page:
+        colunas = to_columns(page)
+        paginas.append(colunas)
+        if len(page) < PAGE_LIMIT or colunas["time"].max() >= end_ms:
+            break
+        page = client.get_my_trades(symbol=symbol, fromId=int(colunas["id"].max()) + 1, limit=PAGE_LIMIT)
+
+    colunas = {c: np.concatenate([p[c] for p in paginas] or [to_columns([])[c]]) for c in TRADE_DTYPES}
+    dentro = (colunas["time"] >= start_ms) & (colunas["time"] < end_ms)
+    colunas = {c: v[dentro] for c, v in colunas.items()}
+    colunas["symbol"] = np.full(int(dentro.sum()), symbol, dtype=object)
+    return colunas
+
+
+def _select(colunas, symbol, from_id, since):
+    query = f"SELECT {colunas} FROM trades WHERE symbol = ?"
+    params = [symbol]
+    if from_id is not None:
+        query += " AND id >= ?"
+        params.append(from_id)
+    if since is not None:
+        query += " AND time >= ?"
+        params.append(int(since))
+    query += " ORDER BY id"
+
+    with storage.connect() as conn:
+        _ensure_schema(conn)
+        return conn.execute(query, params).fetchall()
+
+
+def load_trades(symbol, from_id=None, since=None):
+    """
+    Lê os trades armazenados do par, em ordem de id, no formato da API.
+    `from_id` e `since` (ms) limitam a leitura aos trades mais novos.
+    """
+    return [_from_row(r) for r in _select(_COLUMNS, symbol, from_id, since)]
+
+
+def load_columns(symbol, from_id=None, since=None):
+    """
+    Lê os trades do par, em ordem de id, direto em colunas tipadas
+    (TRADE_DTYPES mais "symbol"), sem montar um dict por trade; prontas
+    para `pd.DataFrame(...)` ou para cálculos com NumPy.
+    """
+    rows = _select(_FRAME_SELECT, symbol, from_id, since)
+    valores = zip(*rows) if rows else [()] * len(TRADE_DTYPES)
+    colunas = {nome: np.array(v, dtype=dtype) for (nome, dtype), v in zip(TRADE_DTYPES.items(), valores)}
+    colunas["symbol"] = np.full(len(rows), symbol, dtype=object)
+    return colunas
+
+
+def executed_qty(orders):
+    """Quantidade executada por ordem nos trades armazenados: {(symbol, order_id): qty}."""
+    if not orders:
+        return {}
+    symbols = sorted({s for s, _ in orders})
+    ids = sorted({o for _, o in orders})
+    with storage.connect() as conn:
+        _ensure_schema(conn)
+        # Par e ordem filtrados juntos para usar o índice (symbol, order_id)
+        rows = conn.execute(
+            f"""SELECT symbol, order_id, TOTAL(qty) FROM trades
+                WHERE symbol IN ({",".join("?" * len(symbols))}) AND order_id IN ({",".join("?" * len(ids))})
+                GROUP BY symbol, order_id""",
+            symbols + ids,
+        ).fetchall()
+    pedidos = set(orders)
+    return {(r[0], r[1]): r[2] for r in rows if (r[0], r[1]) in pedidos}
+
+
+def fingerprint(symbol, upto_id):
+    """
+    Resumo dos trades armazenados até `upto_id`: a quantidade de trades e,
+    dos FINGERPRINT_RECENT mais recentes, a soma dos ids e o volume. Permite
+    detectar se o histórico já processado foi alterado (trades removidos,
+    inseridos ou reescritos no fim) sem somar o histórico inteiro.
+    """
+    with storage.connect() as conn:
+        _ensure_schema(conn)
+        total = conn.execute(
+            "SELECT COUNT(*) FROM trades WHERE symbol = ? AND id <= ?", (symbol, upto_id)
+        ).fetchone()[0]
+        recentes = conn.execute(
+            """SELECT COALESCE(SUM(id), 0), ROUND(TOTAL(qty), 8) FROM (
+                   SELECT id, qty FROM trades WHERE symbol = ? AND id <= ? ORDER BY id DESC LIMIT ?
+               )""",
+            (symbol, upto_id, FINGERPRINT_RECENT),
+        ).fetchone()
+    return f"{total}:{recentes[0]}:{recentes[1]}"
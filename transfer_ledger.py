@@ -0,0 +1,222 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import storage
+
+# Intervalo mínimo entre consultas de depósitos/saques, em segundos
+TRANSFER_SYNC_INTERVAL = float(os.getenv("TRANSFER_SYNC_INTERVAL", "60"))
+
+# Idade a partir da qual os dados de transferências são considerados desatualizados
+TRANSFER_STALE_AFTER = float(os.getenv("TRANSFER_STALE_AFTER", "600"))
+
+# Janela máxima aceita pelos endpoints de histórico de depósitos/saques
+HISTORY_WINDOW_MS = 90 * 24 * 60 * 60 * 1000
+
+# Status considerados concluídos pela API (depósito: 1 = sucesso; saque: 6 = concluído)
+COMPLETED_STATUS = {"deposit": "1", "withdraw": "6"}
+
+# Uma sincronização por vez no processo: quem espera encontra o intervalo recém-renovado e não consulta de novo
+_sync_lock = threading.Lock()
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS transfers (
+        kind TEXT NOT NULL,
+        id TEXT NOT NULL,
+        coin TEXT NOT NULL,
+        amount REAL NOT NULL,
+        status TEXT NOT NULL,
+        time INTEGER NOT NULL,
+        PRIMARY KEY (kind, id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_transfers_coin_time ON transfers (coin, time)",
+    """
+    CREATE TABLE IF NOT EXISTS transfer_sync (
+        kind TEXT PRIMARY KEY,
+        synced_until INTEGER NOT NULL,
+        last_attempt REAL NOT NULL,
+        last_success REAL,
+        last_error TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS transfer_coverage (
+        kind TEXT PRIMARY KEY,
+        covered_from INTEGER NOT NULL
+    )
+    """,
+]
+
+
+def _ensure_schema(conn):
+    for ddl in _SCHEMA:
+        conn.execute(ddl)
+
+
+def _start_of_day_ms():
+    inicio = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return int(inicio.timestamp() * 1000)
+
+
+def _parse_time(value):
+    """Converte o horário da API (ms ou 'YYYY-MM-DD HH:MM:SS' em UTC) para ms."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    dt = datetime.strptime(value, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def _to_row(kind, r):
+    tempo = _parse_time(r["insertTime"] if kind == "deposit" else r["applyTime"])
+    record_id = r.get("id") or r.get("txId") or f"{r['coin']}-{tempo}-{r['amount']}"
+    return (kind, str(record_id), r["coin"], float(r["amount"]), str(r.get("status")), tempo)
+
+
+def _fetch(client, kind, start_ts, end_ts):
+    if kind == "deposit":
+        return client.get_deposit_history(startTime=start_ts, endTime=end_ts) or []
+    return client.get_withdraw_history(startTime=start_ts, endTime=end_ts) or []
+
+
+def _sync_kind(conn, client, kind, now_ms):
+    state = conn.execute(
+        "SELECT synced_until, last_attempt FROM transfer_sync WHERE kind = ?", (kind,)
+    ).fetchone()
+    if state is not None and time.time() - state[1] < TRANSFER_SYNC_INTERVAL:
+        return
+
+    # Busca a partir do último horário visto, recuando até registros ainda pendentes
+    start_ts = _start_of_day_ms() if state is None else state[0]
+    pendente = conn.execute(
+        "SELECT MIN(time) FROM transfers WHERE kind = ? AND status != ?", (kind, COMPLETED_STATUS[kind])
+    ).fetchone()[0]
+    if pendente is not None:
+        start_ts = min(start_ts, pendente)
+
+    try:
+        records = _fetch(client, kind, start_ts, now_ms)
+    except Exception as e:
+        print(f"[Erro] sincronização de {kind}:", e)
+        conn.execute(
+            """INSERT INTO transfer_sync (kind, synced_until, last_attempt, last_error) VALUES (?, ?, ?, ?)
+               ON CONFLICT(kind) DO UPDATE SET last_attempt = excluded.last_attempt, last_error = excluded.last_error""",
+            (kind, start_ts, time.time(), str(e)),
+        )
+        return
+
+    conn.executemany(
+        "INSERT OR REPLACE INTO transfers (kind, id, coin, amount, status, time) VALUES (?, ?, ?, ?, ?, ?)",
+        [_to_row(kind, r) for r in records],
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO transfer_sync (kind, synced_until, last_attempt, last_success, last_error) VALUES (?, ?, ?, ?, NULL)",
+        (kind, now_ms, time.time(), time.time()),
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO transfer_coverage (kind, covered_from) VALUES (?, ?)", (kind, start_ts)
+    )
+
+
+def sync(client):
+    """
+    Atualiza o livro de depósitos e saques de todos os ativos com uma
+    consulta por tipo, apenas para registros mais novos que o último visto
+    (ou ainda pendentes). Respeita TRANSFER_SYNC_INTERVAL entre consultas.
+    """
+    with _sync_lock, storage.connect() as conn:
+        now_ms = int(time.time() * 1000)
+        _ensure_schema(conn)
+        for kind in ("deposit", "withdraw"):
+            _sync_kind(conn, client, kind, now_ms)
+            # Confirma cada tipo para não segurar o lock de escrita durante a consulta do próximo
+            conn.commit()
+
+
+def backfill(client, start_ts):
+    """
+    Estende o livro para trás até `start_ts`, em janelas de até 90 dias.
+    Retorna False se alguma janela falhou (o histórico fica incompleto).
+    """
+    sync(client)
+    ok = True
+    with storage.connect() as conn:
+        _ensure_schema(conn)
+        for kind in ("deposit", "withdraw"):
+            row = conn.execute("SELECT covered_from FROM transfer_coverage WHERE kind = ?", (kind,)).fetchone()
+            if row is None:
+                ok = False
+                continue
+            fim = row[0]
+            while fim > start_ts:
+                inicio = max(start_ts, fim - HISTORY_WINDOW_MS)
+                try:
+                    records = _fetch(client, kind, inicio, fim)
+                except Exception as e:
+                    print(f"[Erro] histórico de {kind}:", e)
+                    ok = False
+                    break
+                conn.executemany(
+                    "INSERT OR REPLACE INTO transfers (kind, id, coin, amount, status, time) VALUES (?, ?, ?, ?, ?, ?)",
+                    [_to_row(kind, r) for r in records],
+                )
+                conn.execute("UPDATE transfer_coverage SET covered_from = ? WHERE kind = ?", (inicio, kind))
+                # Confirma cada janela para não segurar o lock de escrita durante a próxima consulta
+                conn.commit()
+                fim = inicio
+    return ok
+
+
+def net_transfers_by_day(asset, start_ts):
+    """Transferências líquidas concluídas do ativo por dia UTC desde `start_ts`: {data: qtd}."""
+    with storage.connect() as conn:
+        _ensure_schema(conn)
+        rows = conn.execute(
+            """SELECT time / 86400000 AS dia,
+                      TOTAL(CASE WHEN kind = 'deposit' AND status = ? THEN amount END)
+                      - TOTAL(CASE WHEN kind = 'withdraw' AND status = ? THEN amount END)
+               FROM transfers WHERE coin = ? AND time >= ? GROUP BY dia""",
+            (COMPLETED_STATUS["deposit"], COMPLETED_STATUS["withdraw"], asset, start_ts),
+        ).fetchall()
+    return {datetime.fromtimestamp(r[0] * 86400, tz=timezone.utc).date(): r[1] for r in rows}
+
+
+def net_transfers(asset, start_ts, end_ts=None):
+    """Depósitos concluídos menos saques concluídos do ativo no intervalo (ms)."""
+    end_ts = end_ts if end_ts is not None else int(time.time() * 1000)
+    with storage.connect() as conn:
+        _ensure_schema(conn)
+        row = conn.execute(
+            """SELECT
+                   TOTAL(CASE WHEN kind = 'deposit' AND status = ? THEN amount END),
+                   TOTAL(CASE WHEN kind = 'withdraw' AND status = ? THEN amount END)
+               FROM transfers WHERE coin = ? AND time >= ? AND time <= ?""",
+            (COMPLETED_STATUS["deposit"], COMPLETED_STATUS["withdraw"], asset, start_ts, end_ts),
+        ).fetchone()
+    return row[0] - row[1]
+
+
+def get_sync_status():
+    """
+    Situação dos dados de transferências: "ok", "desatualizado" (última
+    sincronização bem-sucedida antiga), "falhou" (última tentativa com erro)
+    ou "sem dados". Retorna {"status", "last_success", "error"}.
+    """
+    with storage.connect() as conn:
+        _ensure_schema(conn)
+        rows = conn.execute("SELECT kind, last_success, last_error FROM transfer_sync").fetchall()
+
+    if len(rows) < 2:
+        return {"status": "sem dados", "last_success": None, "error": None}
+
+    last_success = min((r[1] or 0) for r in rows)
+    error = "; ".join(f"{r[0]}: {r[2]}" for r in rows if r[2])
+    if error:
+        status = "falhou"
+    elif time.time() - last_success > TRANSFER_STALE_AFTER:
+        status = "desatualizado"
+    else:
+        status = "ok"
+    return {"status": status, "last_success": last_success or None, "error": error or None}
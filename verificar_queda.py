@@ -1,96 +1,199 @@
+import argparse
+import contextvars
+import csv
+import json
 import os
-from binance.client import Client
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 
-load_dotenv()
-client = Client(os.getenv("BINANCE_API_KEY"), os.getenv("BINANCE_API_SECRET"))
+import numpy as np
 
-ativos = ["XRP", "CAKE", "TRX", "FUN"]
-symbol_map = {a: a + "USDT" for a in ativos}
+import portfolio
+import trade_store
+import transfer_ledger
+from binance_client import client, refresh_account_snapshot, refresh_prices, get_opening_price
+from pnl_calculator import calculate_daily_pnl
 
-def get_real_balance(token):
-    for b in client.get_account()["balances"]:
-        if b["asset"] == token:
-            return float(b["free"]) + float(b["locked"])
-    return 0.0
+load_dotenv()
 
-def get_trades(symbol):
+# Moeda de cotação dos pares reconciliados
+QUOTE_ASSET = "USDT"
+
+# Ativos reconciliados em paralelo (trades, abertura do dia e PnL do painel)
+MAX_WORKERS = int(os.getenv("COLLECTOR_MAX_WORKERS", "8"))
+
+# Diferença (USDT) entre os dois cálculos de PnL a partir da qual o ativo é destacado
+TOLERANCIA = float(os.getenv("RECONCILIACAO_TOLERANCIA", "0.01"))
+
+# Colunas da saída em CSV/JSON, na ordem
+CAMPOS = [
+    "ativo", "symbol", "qtd_atual", "qtd_comprada_hoje", "preco_atual", "preco_abertura",
+    "entrada_liquida", "pnl_binance", "pnl_painel", "diferenca", "erro",
+]
+
+def _janela_do_dia(dia):
+    """Início e fim (ms, fim exclusivo) do dia em UTC."""
+    inicio = int(datetime(dia.year, dia.month, dia.day, tzinfo=timezone.utc).timestamp() * 1000)
+    return inicio, inicio + 86_400_000
+
+def get_trades(symbol, dia):
+    """
+    Trades do par no dia. Pares com histórico local são sincronizados de
+    forma incremental; os demais têm só a janela do dia buscada na API,
+    sem gravar nem percorrer o histórico inteiro da conta.
+    """
+    inicio, fim = _janela_do_dia(dia)
+    if trade_store.last_trade_id(symbol) is None:
+        return trade_store.fetch_window(client, symbol, inicio, fim)
     try:
-        return client.get_my_trades(symbol=symbol)
+        trade_store.sync_trades(client, symbol)
     except Exception as e:
-        print(f"[ERRO] get_trades({symbol}):", e)
-        return []
-
-def get_price(symbol):
-    return float(client.get_symbol_ticker(symbol=symbol)["price"])
-
-def get_opening_price(symbol):
+        print(f"[ERRO] get_trades({symbol}):", e, file=sys.stderr)
+    return trade_store.load_columns(symbol, since=inicio)
+
+def calcular_entrada_liquida_e_qtd(trades, dia=None):
+    """
+    Valor (USDT) e quantidade compradas no dia (UTC) a partir das colunas
+    tipadas dos trades (`trade_store.load_columns`, ou uma lista da API),
+    ordenados por id e portanto por tempo: a janela do dia é localizada com
+    searchsorted sobre os tempos.
+    """
+    colunas = trades if isinstance(trades, dict) else trade_store.to_columns(trades)
+    inicio, fim = _janela_do_dia(dia or datetime.now(timezone.utc).date())
+    a, b = np.searchsorted(colunas["time"], [inicio, fim], side="left")
+
+    compra = colunas["isBuyer"][a:b]
+    qty, price = colunas["qty"][a:b], colunas["price"][a:b]
+    return float(np.sum(qty * price, where=compra)), float(np.sum(qty, where=compra))
+
+def descobrir_ativos(saldos, precos):
+    """
+    Ativos com saldo (free + locked) diferente de zero e par em QUOTE_ASSET,
+    a partir de um único snapshot da conta. Retorna ([ativos], [sem par]).
+    """
+    com_saldo = sorted(a for a, (free, locked) in saldos.items() if free + locked != 0 and a != QUOTE_ASSET)
+    return [a for a in com_saldo if a + QUOTE_ASSET in precos], [a for a in com_saldo if a + QUOTE_ASSET not in precos]
+
+def reconciliar_ativo(token, qtd_atual, preco_atual, dia):
+    """
+    PnL do dia do ativo pela regra da Binance (abertura do dia) comparado ao
+    `calculate_daily_pnl` do painel; sem saldo de abertura registrado pelo
+    painel, pnl_painel e diferenca ficam vazios.
+    """
+    symbol = token + QUOTE_ASSET
+    linha = dict.fromkeys(CAMPOS)
+    linha.update(ativo=token, symbol=symbol, qtd_atual=qtd_atual, preco_atual=preco_atual)
     try:
-        hoje = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-        start_ts = int(hoje.timestamp() * 1000)
-        end_ts = int((hoje + timedelta(hours=1)).timestamp() * 1000)
-
-        klines = client.get_klines(
-            symbol=symbol,
-            interval=Client.KLINE_INTERVAL_1HOUR,
-            startTime=start_ts,
-            endTime=end_ts,
-            limit=1
-        )
-        if klines:
-            return float(klines[0][1])
+        preco_abertura = get_opening_price(symbol)
+        if preco_abertura is None:
+            linha["erro"] = "preço de abertura não encontrado"
+            return linha
+        entrada_liquida, qtd_comprada_hoje = calcular_entrada_liquida_e_qtd(get_trades(symbol, dia), dia)
+        qtd_inicial = qtd_atual - qtd_comprada_hoje
+        pnl = qtd_atual * preco_atual - qtd_inicial * preco_abertura - entrada_liquida
+        # Só consulta o diário do painel: a reconciliação não registra saldos de abertura
+        pnl_dia = calculate_daily_pnl(token, qtd_atual, preco_atual, registrar=False)
     except Exception as e:
-        print(f"[Erro ao buscar preço abertura {symbol}]: {e}")
-    return None
-
-def calcular_entrada_liquida_e_qtd(trades):
-    entrada = 0.0
-    qtd_hoje = 0.0
-    hoje = datetime.now(timezone.utc).date()
-
-    for t in trades:
-        if t.get("isBuyer", False):
-            data_trade = datetime.fromtimestamp(t["time"] / 1000, tz=timezone.utc).date()
-            if data_trade == hoje:
-                valor = float(t["qty"]) * float(t["price"])
-                entrada += valor
-                qtd_hoje += float(t["qty"])
-    return entrada, qtd_hoje
-
-# Execução principal
-print("🔍 Comparando com Binance...\n")
-pnl_total = 0.0
-
-for token in ativos:
-    symbol = symbol_map[token]
-    qtd_atual = get_real_balance(token)
-    preco_atual = get_price(symbol)
-    preco_abertura = get_opening_price(symbol)
-    trades = get_trades(symbol)
-
-    if preco_abertura is None:
-        print(f"🪙 {token}")
-        print("  ⚠️ Preço de abertura não encontrado.")
-        print("-" * 40)
-        continue
-
-    entrada_liquida, qtd_comprada_hoje = calcular_entrada_liquida_e_qtd(trades)
-    qtd_inicial = qtd_atual - qtd_comprada_hoje
-
-    valor_final = qtd_atual * preco_atual
-    valor_inicial = qtd_inicial * preco_abertura
-    pnl = valor_final - valor_inicial - entrada_liquida
-    pnl_total += pnl
-
-    print(f"🪙 {token}")
-    print(f"  Quantidade atual:        {qtd_atual}")
-    print(f"  Preço atual:             ${preco_atual:.4f}")
-    print(f"  Preço abertura (00:00):  ${preco_abertura:.4f}")
-    print(f"  Valor final do ativo:    ${valor_final:.2f}")
-    print(f"  Valor inicial do ativo:  ${valor_inicial:.2f}")
-    print(f"  Entrada líquida (net):   ${entrada_liquida:.2f}")
-    print(f"  📊 PnL do Dia (Binance):  ${pnl:+.2f}")
-    print("-" * 40)
-
-print(f"\n📊 PnL Total do Dia (modo Binance): ${pnl_total:+.2f}")
+        linha["erro"] = str(e)
+        return linha
+
+    linha.update(
+        qtd_comprada_hoje=qtd_comprada_hoje, preco_abertura=preco_abertura, entrada_liquida=entrada_liquida,
+        pnl_binance=pnl,
+    )
+    if pnl_dia is not None:
+        linha.update(pnl_painel=pnl_dia[1], diferenca=pnl - pnl_dia[1])
+    return linha
+
+def reconciliar(ativos=None, max_workers=MAX_WORKERS):
+    """
+    Reconcilia o PnL do dia de todos os ativos com saldo da conta atual (ou
+    dos `ativos` indicados): um snapshot da conta e uma consulta de tickers
+    para todos, e os dados de cada ativo buscados em paralelo.
+    Retorna uma linha (dict com CAMPOS) por ativo.
+    """
+    dia = datetime.now(timezone.utc).date()
+    saldos = refresh_account_snapshot()
+    precos = refresh_prices()
+    # Transferências de todos os ativos de uma vez, antes das threads (cada uma só lê o livro)
+    transfer_ledger.sync(client)
+
+    if ativos is None:
+        ativos, sem_par = descobrir_ativos(saldos, precos)
+    else:
+        sem_par = [a for a in ativos if a + QUOTE_ASSET not in precos]
+        ativos = [a for a in ativos if a + QUOTE_ASSET in precos]
+
+    linhas = [dict(dict.fromkeys(CAMPOS), ativo=a, erro=f"sem par {QUOTE_ASSET}") for a in sem_par]
+    workers = max(1, min(max_workers, len(ativos)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futuros = [
+            pool.submit(
+                contextvars.copy_context().run, reconciliar_ativo,
+                token, sum(saldos.get(token, (0.0, 0.0))), precos[token + QUOTE_ASSET], dia,
+            )
+            for token in ativos
+        ]
+        linhas += [f.result() for f in futuros]
+    return sorted(linhas, key=lambda l: l["ativo"])
+
+def _imprimir_texto(linhas, saida):
+    print("🔍 Comparando com Binance...\n", file=saida)
+    pnl_total = 0.0
+    for l in linhas:
+        print(f"🪙 {l['ativo']}", file=saida)
+        if l["erro"]:
+            print(f"  ⚠️ {l['erro']}", file=saida)
+            print("-" * 40, file=saida)
+            continue
+        pnl_total += l["pnl_binance"]
+        valor_inicial = (l["qtd_atual"] - l["qtd_comprada_hoje"]) * l["preco_abertura"]
+        print(f"  Quantidade atual:        {l['qtd_atual']}", file=saida)
+        print(f"  Preço atual:             ${l['preco_atual']:.4f}", file=saida)
+        print(f"  Preço abertura (00:00):  ${l['preco_abertura']:.4f}", file=saida)
+        print(f"  Valor final do ativo:    ${l['qtd_atual'] * l['preco_atual']:.2f}", file=saida)
+        print(f"  Valor inicial do ativo:  ${valor_inicial:.2f}", file=saida)
+        print(f"  Entrada líquida (net):   ${l['entrada_liquida']:.2f}", file=saida)
+        print(f"  📊 PnL do Dia (Binance):  ${l['pnl_binance']:+.2f}", file=saida)
+        if l["pnl_painel"] is None:
+            print("  PnL do Dia (painel):     sem registro de abertura hoje", file=saida)
+        else:
+            alerta = " ⚠️" if abs(l["diferenca"]) > TOLERANCIA else ""
+            print(f"  PnL do Dia (painel):     ${l['pnl_painel']:+.2f} (diferença ${l['diferenca']:+.2f}){alerta}", file=saida)
+        print("-" * 40, file=saida)
+
+    print(f"\n📊 PnL Total do Dia (modo Binance): ${pnl_total:+.2f}", file=saida)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconcilia o PnL do dia de todos os ativos da conta com o do painel.")
+    parser.add_argument("--conta", default=portfolio.CONTA_PADRAO, help="conta do portfólio")
+    parser.add_argument("--ativos", nargs="+", help="limita a reconciliação a estes ativos (ex.: XRP TRX)")
+    parser.add_argument("--formato", choices=["texto", "csv", "json"], default="texto")
+    parser.add_argument("--saida", help="arquivo de saída (padrão: tela)")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    args = parser.parse_args(argv)
+
+    with portfolio.usar_conta(args.conta):
+        linhas = reconciliar(args.ativos, args.workers)
+
+    saida = open(args.saida, "w", newline="") if args.saida else sys.stdout
+    try:
+        if args.formato == "csv":
+            writer = csv.DictWriter(saida, fieldnames=CAMPOS)
+            writer.writeheader()
+            writer.writerows(linhas)
+        elif args.formato == "json":
+            json.dump(linhas, saida, indent=2, ensure_ascii=False)
+            saida.write("\n")
+        else:
+            _imprimir_texto(linhas, saida)
+    finally:
+        if args.saida:
+            saida.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
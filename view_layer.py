@@ -0,0 +1,107 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Linhas por página das tabelas de trades do painel
+PAGE_SIZE = int(os.getenv("PAINEL_LINHAS_POR_PAGINA", "100"))
+
+# Pontos por série enviados ao navegador nos gráficos de séries temporais
+MAX_PONTOS_GRAFICO = int(os.getenv("PAINEL_PONTOS_GRAFICO", "500"))
+
+
+def filtrar(df, filtros):
+    """
+    Mantém as linhas cujo valor em cada coluna de `filtros` ({coluna: [valores]})
+    está entre os escolhidos; listas vazias não filtram.
+    """
+    mascara = np.ones(len(df), dtype=bool)
+    for coluna, valores in filtros.items():
+        if valores and coluna in df.columns:
+            mascara &= df[coluna].isin(valores).to_numpy()
+    return df if mascara.all() else df[mascara]
+
+
+def ordenar(df, coluna, crescente=True):
+    """Ordenação estável pela coluna, com valores ausentes sempre no fim."""
+    if coluna is None or coluna not in df.columns:
+        return df
+    return df.sort_values(coluna, ascending=crescente, kind="mergesort", na_position="last")
+
+
+def paginar(df, pagina, tamanho=PAGE_SIZE):
+    """Fatia a página `pagina` (a partir de 1, limitada ao intervalo válido): (fatia, página, total de páginas)."""
+    total = max(1, -(-len(df) // tamanho))
+    pagina = min(max(1, int(pagina)), total)
+    inicio = (pagina - 1) * tamanho
+    return df.iloc[inicio:inicio + tamanho], pagina, total
+
+
+def lttb(x, y, n):
+    """
+    Índices dos `n` pontos escolhidos pelo Largest-Triangle-Three-Buckets:
+    primeiro e último ponto fixos e, em cada balde intermediário, o ponto que
+    forma o maior triângulo com o escolhido antes e a média do balde seguinte.
+    """
+    tamanho = len(y)
+    if n >= tamanho or n < 3:
+        return np.arange(tamanho)
+
+    limites = np.linspace(1, tamanho - 1, n - 1).astype("int64")
+    indices = np.empty(n, dtype="int64")
+    indices[0], indices[-1] = 0, tamanho - 1
+    a = 0
+    for i in range(n - 2):
+        inicio, fim = limites[i], max(limites[i + 1], limites[i] + 1)
+        prox_inicio, prox_fim = limites[i + 1], limites[i + 2] if i + 2 < len(limites) else tamanho
+        mx, my = x[prox_inicio:prox_fim].mean(), y[prox_inicio:prox_fim].mean()
+        areas = np.abs((x[a] - mx) * (y[inicio:fim] - y[a]) - (x[a] - x[inicio:fim]) * (my - y[a]))
+        a = inicio + int(np.argmax(areas))
+        indices[i + 1] = a
+    return indices
+
+
+def minmax(y, n):
+    """
+    Índices do mínimo e do máximo de cada balde (n/2 baldes de tamanho igual),
+    mais o primeiro e o último ponto: preserva picos e vales da série.
+    """
+    tamanho = len(y)
+    baldes = n // 2
+    if n >= tamanho or baldes < 1:
+        return np.arange(tamanho)
+
+    limites = np.linspace(0, tamanho, baldes + 1).astype("int64")
+    escolhidos = [0, tamanho - 1]
+    for inicio, fim in zip(limites[:-1], limites[1:]):
+        if fim > inicio:
+            escolhidos += [inicio + int(np.argmin(y[inicio:fim])), inicio + int(np.argmax(y[inicio:fim]))]
+    return np.unique(escolhidos)
+
+
+def _eixo_x(index):
+    """Eixo x numérico do índice: o instante para datas, o próprio valor se numérico, a posição nos demais casos."""
+    if pd.api.types.is_numeric_dtype(index):
+        return index.to_numpy(dtype="float64")
+    try:
+        return pd.to_datetime(index).asi8.astype("float64")
+    except (TypeError, ValueError):
+        return np.arange(len(index), dtype="float64")
+
+
+def reduzir(dados, max_pontos=MAX_PONTOS_GRAFICO, metodo="lttb"):
+    """
+    Reduz uma Series ou DataFrame (índice = eixo x, ordenado) a no máximo
+    `max_pontos` pontos por coluna, preservando a forma da série com LTTB
+    (linhas) ou mínimo/máximo por balde (barras). Em um DataFrame, os pontos
+    escolhidos para cada coluna são unidos.
+    """
+    if len(dados) <= max_pontos:
+        return dados
+    x = _eixo_x(dados.index)
+    colunas = [dados] if isinstance(dados, pd.Series) else [dados[c] for c in dados.columns]
+    escolhidos = []
+    for coluna in colunas:
+        y = np.nan_to_num(coluna.to_numpy(dtype="float64"))
+        escolhidos.append(lttb(x, y, max_pontos) if metodo == "lttb" else minmax(y, max_pontos))
+    return dados.iloc[np.unique(np.concatenate(escolhidos))]